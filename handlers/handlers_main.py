@@ -28,11 +28,12 @@ from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
 
 # --- Внутренние модули ---
-from services.config import get_valid_config, save_config, format_config_summary, get_allowed_users
+from services.config import get_valid_config, save_config, format_config_summary, get_allowed_users, get_use_redis
 from services.menu import update_menu, config_action_keyboard 
 from services.balance import refresh_balance
 from services.buy_bot import buy_gift
 from services.buy_userbot import buy_gift_userbot
+from services.state_redis import reset_profile_states
 from middlewares.access_control import show_guest_menu
 from utils.log_cache import get_cached_text
 
@@ -232,6 +233,8 @@ def register_main_handlers(dp: Dispatcher, bot: Bot, version: str) -> None:
             profile["DONE"] = False
         config["ACTIVE"] = False
         await save_config(config)
+        if get_use_redis():
+            await reset_profile_states(call.from_user.id, len(config["PROFILES"]))
         info = format_config_summary(config, call.from_user.id)
         try:
             await call.message.edit_text(
@@ -319,5 +322,5 @@ def register_main_handlers(dp: Dispatcher, bot: Bot, version: str) -> None:
             f'✅ Баланс успешно пополнен.',
             message_effect_id="5104841245755180586"
         )
-        balance = await refresh_balance(bot)
+        balance = await refresh_balance(bot, force=True)
         await update_menu(bot=bot, chat_id=message.chat.id, user_id=message.from_user.id, message_id=message.message_id)
@@ -45,10 +45,11 @@ from aiogram.fsm.state import State, StatesGroup
 from aiogram.exceptions import TelegramBadRequest, TelegramAPIError
 
 # --- Внутренние модули ---
-from services.config import get_valid_config, get_target_display, save_config, get_deposit_enabled
+from services.config import get_valid_config, get_target_display, save_config, get_deposit_enabled, get_use_redis
 from services.menu import update_menu, payment_keyboard
 from services.balance import refresh_balance, refund_all_star_payments
 from services.config import CURRENCY, MAX_PROFILES, DEVICE_MODELS, SYSTEM_VERSIONS, APP_VERSIONS, add_profile, remove_profile, update_profile, get_allowed_users
+from services.state_redis import reset_profile_state, shift_profile_states
 from services.userbot import is_userbot_active, is_userbot_premium, userbot_send_self, delete_userbot_session, start_userbot, continue_userbot_signin, finish_userbot_signin, RESTART_REQUIRED
 from middlewares.access_control import show_guest_menu
 from utils.misc import now_str, is_valid_profile_name, PHONE_REGEX, API_HASH_REGEX
@@ -1336,11 +1337,16 @@ async def save_sender_and_finish(call: CallbackQuery, state: FSMContext, sender:
 
     if idx is None:
         await add_profile(config, profile_data)
+        if get_use_redis():
+            await reset_profile_state(call.from_user.id, len(config["PROFILES"]) - 1)
         msg = "✅ <b>Новый профиль</b> создан."
         await call.message.edit_text(msg)
         await profiles_menu(call.message, call.from_user.id)
     else:
         await update_profile(config, idx, profile_data)
+        if get_use_redis():
+            # Счётчики отредактированного профиля обнулены — обнуляем и общие счётчики
+            await reset_profile_state(call.from_user.id, idx)
         msg = f"✅ <b>Профиль {idx + 1}</b> обновлён."
         await call.message.edit_text(msg)
         await call.message.answer(
@@ -1495,7 +1501,11 @@ async def on_profile_delete_final(call: CallbackQuery):
     if len(config["PROFILES"]) == 1:
         config["ACTIVE"] = False
         await save_config(config)
+    profiles_count = len(config["PROFILES"])
     await remove_profile(config, idx, call.from_user.id)
+    if get_use_redis():
+        # Индексы следующих профилей сдвинулись — сдвигаем их состояние в Redis
+        await shift_profile_states(call.from_user.id, idx, profiles_count)
     await call.message.edit_text(f"✅ <b>Профиль {idx + 1}</b> удалён.{default_added}", reply_markup=None)
     await profiles_menu(call.message, call.from_user.id)
     await call.answer()
@@ -1857,7 +1867,7 @@ async def refund_input(message: Message, state: FSMContext):
             telegram_payment_charge_id=txn_id
         )
         await message.answer("✅ Возврат успешно выполнен.")
-        balance = await refresh_balance(message.bot)
+        balance = await refresh_balance(message.bot, force=True)
         await update_menu(bot=message.bot, chat_id=message.chat.id, user_id=message.from_user.id, message_id=message.message_id)
     except Exception as e:
         await message.answer(f"🚫 Ошибка при возврате:\n<code>{e}</code>")
@@ -1925,7 +1935,7 @@ async def withdraw_all_handler(message: Message):
         await show_guest_menu(message)
         return
 
-    balance = await refresh_balance(message.bot)
+    balance = await refresh_balance(message.bot, force=True)
     if balance == 0:
         await message.answer("⚠️ Не найдено звёзд для возврата.")
         await update_menu(bot=message.bot, chat_id=message.chat.id, user_id=message.from_user.id, message_id=message.message_id)
@@ -1985,7 +1995,7 @@ async def withdraw_all_confirmed(call: CallbackQuery) -> None:
     else:
         await call.message.answer("🚫 Звёзд для возврата не найдено.")
 
-    balance = await refresh_balance(call.bot)
+    balance = await refresh_balance(call.bot, force=True)
     await update_menu(bot=call.bot, chat_id=call.message.chat.id, user_id=call.from_user.id, message_id=call.message.message_id)
 
 
@@ -20,12 +20,16 @@
 import asyncio
 import logging
 import sys
+from collections import Counter
+from functools import partial
+from itertools import chain
 
 # --- Сторонние библиотеки ---
 from aiogram import Bot, Dispatcher
 from aiogram.utils.backoff import BackoffConfig
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter
 from aiogram.fsm.storage.memory import MemoryStorage
 from pyrogram.errors import SecurityCheckMismatch
 
@@ -33,12 +37,13 @@ from pyrogram.errors import SecurityCheckMismatch
 from services.config import (
     ensure_config,
     save_config,
+    flush_config,
     get_valid_config,
     get_target_display,
     migrate_config_if_needed,
     add_allowed_user,
     set_use_redis,
-    set_redis_config,
+    get_use_redis,
     update_config_from_env,
     VERSION,
     PURCHASE_COOLDOWN,
@@ -49,8 +54,10 @@ from services.config import (
 from services.menu import update_menu
 from services.balance import refresh_balance
 from services.gifts_manager import get_best_gift_list, userbot_gifts_updater, filter_gifts_by_profile
+from services.gifts_redis import configure_redis, warmup_redis
 from services.buy_bot import buy_gift
 from services.buy_userbot import buy_gift_userbot
+from services.state_redis import acquire_profile_lock, release_profile_lock, sync_profile_state, record_purchase, set_profile_done, get_state_generation
 from services.userbot import try_start_userbot_from_config
 from handlers.handlers_wizard import register_wizard_handlers
 from handlers.handlers_catalog import register_catalog_handlers
@@ -68,10 +75,38 @@ logging.getLogger().addHandler(LOG_CACHE_HANDLER)
 
 TOKEN = get_env_variable("TELEGRAM_BOT_TOKEN")
 USER_ID = int(get_env_variable("TELEGRAM_USER_ID", 0))
-ALLOWED_USER_IDS = []
-ALLOWED_USER_IDS.append(USER_ID)
+ALLOWED_USER_IDS = frozenset({USER_ID})
 add_allowed_user(USER_ID)
 
+def _format_profile_report(profile: dict, profile_index: int, purchases: list[dict], status: str, user_id: int) -> list[str]:
+    """
+    Формирует строки отчёта по профилю после прохода воркера.
+
+    :param profile: Словарь профиля
+    :param profile_index: Индекс профиля в конфиге
+    :param purchases: Список покупок за проход ({"id", "price"})
+    :param status: "done" — профиль завершён, "partial" — выполнен частично
+    :param user_id: ID пользователя для отображения "Вы"
+    :return: Список строк отчёта
+    """
+    header = "✅ <b>Профиль {}</b>" if status == "done" else "⚠️ <b>Профиль {}</b> (частично)"
+    target_display = get_target_display(profile, user_id)
+    summary_lines = [
+        f"\n┌{header.format(profile_index + 1)}\n"
+        f"├👤 <b>Получатель:</b> {target_display}\n"
+        f"├💸 <b>Потрачено:</b> {profile['SPENT']:,} / {profile['LIMIT']:,} ★\n"
+        f"└🎁 <b>Куплено </b>{profile['BOUGHT']} из {profile['COUNT']}:"
+    ]
+
+    # Группируем покупки по подарку, сохраняя порядок первой покупки
+    gift_summary = Counter((p["id"], p["price"]) for p in purchases)
+    last_idx = len(gift_summary) - 1
+    for idx, ((_, price), count) in enumerate(gift_summary.items()):
+        prefix = "   └" if idx == last_idx else "   ├"
+        summary_lines.append(f"{prefix} {price:,} ★ × {count}")
+    return summary_lines
+
+
 async def gift_purchase_worker(bot: Bot) -> None:
     """
     Фоновый воркер для покупки подарков по профилям.
@@ -82,6 +117,8 @@ async def gift_purchase_worker(bot: Bot) -> None:
     :return: None
     """
     await refresh_balance(bot)
+    fail_count = 0  # Количество сетевых ошибок подряд
+    state_generation = None  # Последнее увиденное поколение общего состояния профилей в Redis
     while True:
         try:
             config = await get_valid_config(USER_ID)
@@ -95,157 +132,153 @@ async def gift_purchase_worker(bot: Bot) -> None:
             progress_made = False  # Был ли прогресс по профилям на этом проходе
             any_success = True
 
+            use_redis = get_use_redis()
+
+            # Завершённые профили сверяем с Redis, только если общее состояние сбрасывалось
+            recheck_done = False
+            if use_redis:
+                generation = await get_state_generation(USER_ID)
+                if generation is not None:
+                    recheck_done = generation != state_generation
+                    state_generation = generation
+
             # Получаем полный список лимитных подарков
             all_gifts = await get_best_gift_list(USER_ID, bot, REQUEST_PROFILE)
 
             for profile_index, profile in enumerate(config["PROFILES"]):
-                # Пропускаем завершённые профили
-                if profile.get("DONE"):
+                # Пропускаем завершённые профили (после сброса в Redis — сверяем их с общими счётчиками)
+                if profile.get("DONE") and not recheck_done:
                     continue
-                # Пропускаем профили с выключенным юзерботом
+                # Выбираем функцию покупки один раз на профиль
+                # и пропускаем профили с выключенным юзерботом
                 sender = profile.get("SENDER", "bot")
-                if sender == "userbot":
+                if sender == "bot":
+                    buy_fn = partial(buy_gift, bot=bot, env_user_id=USER_ID)
+                elif sender == "userbot":
                     userbot_config = config.get("USERBOT", {})
                     if not userbot_config.get("ENABLED", False):
                         continue
+                    buy_fn = partial(buy_gift_userbot, session_user_id=USER_ID)
+                else:
+                    buy_fn = None  # Неизвестный отправитель — проверяется ниже, если есть подходящие подарки
 
-                COUNT = profile["COUNT"]
-                LIMIT = profile.get("LIMIT", 0)
-                TARGET_USER_ID = profile["TARGET_USER_ID"]
-                TARGET_CHAT_ID = profile["TARGET_CHAT_ID"]
+                # При работе через Redis профиль обрабатывает только захвативший его воркер
+                if use_redis and not await acquire_profile_lock(USER_ID, profile_index):
+                    continue
 
-                # Фильтруем полный список подарков под текущий профиль
-                filtered_gifts = filter_gifts_by_profile(all_gifts, profile)
-                if MORE_LOGS:
-                    logger.info(f"Доступно подарков после фильтрации в профиле {profile_index}: {len(filtered_gifts)}")
+                try:
+                    # Счётчики в Redis общие для всех экземпляров — переносим их в свой конфиг
+                    if use_redis:
+                        shared_state = await sync_profile_state(USER_ID, profile_index, profile)
+                        if shared_state is None:
+                            continue
+                        if any(profile[key] != value for key, value in shared_state.items()):
+                            config = await get_valid_config(USER_ID)
+                            profile = config["PROFILES"][profile_index]
+                            profile.update(shared_state)
+                            await save_config(config)
+                        if profile["DONE"]:
+                            continue
+
+                    COUNT = profile["COUNT"]
+                    LIMIT = profile.get("LIMIT", 0)
+                    TARGET_USER_ID = profile["TARGET_USER_ID"]
+                    TARGET_CHAT_ID = profile["TARGET_CHAT_ID"]
+
+                    # Фильтруем полный список подарков под текущий профиль (лениво)
+                    filtered_gifts = filter_gifts_by_profile(all_gifts, profile)
+                    if MORE_LOGS:
+                        filtered_gifts = list(filtered_gifts)
+                        logger.info(f"Доступно подарков после фильтрации в профиле {profile_index}: {len(filtered_gifts)}")
+                        filtered_gifts = iter(filtered_gifts)
+
+                    first_gift = next(filtered_gifts, None)
+                    if first_gift is None:
+                        continue
 
-                if not filtered_gifts:
-                    continue
+                    # Подходящие подарки есть, но купить их некем — считаем попытку неудачной
+                    if buy_fn is None:
+                        logger.warning(f"Неизвестный отправитель SENDER={sender} в профиле {profile_index}")
+                        any_success = False
+                        continue
 
-                purchases = []
-                before_bought = profile["BOUGHT"]
-                before_spent = profile["SPENT"]
-
-                for gift in filtered_gifts:
-                    gift_id = gift["id"]
-                    gift_price = gift["price"]
-                    gift_total_count = gift["supply"]
-                    sticker_file_id = gift["sticker_file_id"]
-
-                    # Проверяем лимит перед каждой покупкой
-                    while (profile["BOUGHT"] < COUNT and
-                           profile["SPENT"] + gift_price <= LIMIT):
-
-                        sender = profile.get("SENDER", "bot")
-                        if sender == "bot":
-                            success = await buy_gift(
-                                bot=bot,
-                                env_user_id=USER_ID,
-                                gift_id=gift_id,
-                                target_user_id=TARGET_USER_ID,
-                                target_chat_id=TARGET_CHAT_ID,
-                                gift_price=gift_price,
-                                file_id=sticker_file_id
-                            )
-                        elif sender == "userbot":
-                            userbot_config = config.get("USERBOT", {})
-                            success = await buy_gift_userbot(
-                                session_user_id=USER_ID,
+                    purchases = []
+                    state_sync_failed = False  # Покупка не попала в общие счётчики Redis
+                    before_bought = profile["BOUGHT"]
+                    before_spent = profile["SPENT"]
+
+                    for gift in chain((first_gift,), filtered_gifts):
+                        gift_id = gift["id"]
+                        gift_price = gift["price"]
+                        gift_total_count = gift["supply"]
+                        sticker_file_id = gift["sticker_file_id"]
+
+                        # Проверяем лимит перед каждой покупкой
+                        while (profile["BOUGHT"] < COUNT and
+                               profile["SPENT"] + gift_price <= LIMIT):
+
+                            success = await buy_fn(
                                 gift_id=gift_id,
                                 target_user_id=TARGET_USER_ID,
                                 target_chat_id=TARGET_CHAT_ID,
                                 gift_price=gift_price,
                                 file_id=sticker_file_id
                             )
-                        else:
-                            logger.warning(f"Неизвестный отправитель SENDER={sender} в профиле {profile_index}")
-                            success = False
-
-                        if not success:
-                            any_success = False
-                            break  # Не удалось купить — пробуем следующий подарок
 
+                            if not success:
+                                any_success = False
+                                break  # Не удалось купить — пробуем следующий подарок
+
+                            config = await get_valid_config(USER_ID)
+                            profile = config["PROFILES"][profile_index]
+                            profile["BOUGHT"] += 1
+                            profile["SPENT"] += gift_price
+                            purchases.append({"id": gift_id, "price": gift_price})
+                            await save_config(config)
+                            if use_redis and not await record_purchase(USER_ID, profile_index, gift_price):
+                                # Покупка не учтена в общих счётчиках — не продолжаем, чтобы не превысить лимит
+                                state_sync_failed = True
+                                break
+                            await asyncio.sleep(PURCHASE_COOLDOWN)
+
+                            # Проверяем: не достигли ли лимит после покупки
+                            if profile["SPENT"] >= LIMIT:
+                                break
+
+                        if profile["BOUGHT"] >= COUNT or profile["SPENT"] >= LIMIT or state_sync_failed:
+                            break  # Достигли лимит либо по количеству, либо по сумме
+
+                    after_bought = profile["BOUGHT"]
+                    after_spent = profile["SPENT"]
+                    made_local_progress = (after_bought > before_bought) or (after_spent > before_spent)
+
+                    # Профиль полностью выполнен: либо по количеству, либо по лимиту
+                    if (profile["BOUGHT"] >= COUNT or profile["SPENT"] >= LIMIT) and not profile["DONE"]:
                         config = await get_valid_config(USER_ID)
                         profile = config["PROFILES"][profile_index]
-                        profile["BOUGHT"] += 1
-                        profile["SPENT"] += gift_price
-                        purchases.append({"id": gift_id, "price": gift_price})
+                        profile["DONE"] = True
                         await save_config(config)
-                        await asyncio.sleep(PURCHASE_COOLDOWN)
-
-                        # Проверяем: не достигли ли лимит после покупки
-                        if profile["SPENT"] >= LIMIT:
-                            break
-
-                    if profile["BOUGHT"] >= COUNT or profile["SPENT"] >= LIMIT:
-                        break  # Достигли лимит либо по количеству, либо по сумме
-
-                after_bought = profile["BOUGHT"]
-                after_spent = profile["SPENT"]
-                made_local_progress = (after_bought > before_bought) or (after_spent > before_spent)
-
-                # Профиль полностью выполнен: либо по количеству, либо по лимиту
-                if (profile["BOUGHT"] >= COUNT or profile["SPENT"] >= LIMIT) and not profile["DONE"]:
-                    config = await get_valid_config(USER_ID)
-                    profile = config["PROFILES"][profile_index]
-                    profile["DONE"] = True
-                    await save_config(config)
-
-                    target_display = get_target_display(profile, USER_ID)
-                    summary_lines = [
-                        f"\n┌✅ <b>Профиль {profile_index+1}</b>\n"
-                        f"├👤 <b>Получатель:</b> {target_display}\n"
-                        f"├💸 <b>Потрачено:</b> {profile['SPENT']:,} / {LIMIT:,} ★\n"
-                        f"└🎁 <b>Куплено </b>{profile['BOUGHT']} из {COUNT}:"
-                    ]
-                    gift_summary = {}
-                    for p in purchases:
-                        key = p["id"]
-                        if key not in gift_summary:
-                            gift_summary[key] = {"price": p["price"], "count": 0}
-                        gift_summary[key]["count"] += 1
-
-                    gift_items = list(gift_summary.items())
-                    for idx, (gid, data) in enumerate(gift_items):
-                        prefix = "   └" if idx == len(gift_items) - 1 else "   ├"
-                        summary_lines.append(
-                            f"{prefix} {data['price']:,} ★ × {data['count']}"
-                        )
-                    report_message_lines += summary_lines
-
-                    logger.info(f"Профиль #{profile_index+1} завершён")
-                    progress_made = True
-                    await refresh_balance(bot)
-                    continue  # К следующему профилю
-
-                # Если ничего не куплено — баланс/лимит/подарки кончились
-                if (profile["BOUGHT"] < COUNT or profile["SPENT"] < LIMIT) and not profile["DONE"] and made_local_progress:
-                    target_display = get_target_display(profile, USER_ID)
-                    summary_lines = [
-                        f"\n┌⚠️ <b>Профиль {profile_index+1}</b> (частично)\n"
-                        f"├👤 <b>Получатель:</b> {target_display}\n"
-                        f"├💸 <b>Потрачено:</b> {profile['SPENT']:,} / {LIMIT:,} ★\n"
-                        f"└🎁 <b>Куплено </b>{profile['BOUGHT']} из {COUNT}:"
-                    ]
-                    gift_summary = {}
-                    for p in purchases:
-                        key = p["id"]
-                        if key not in gift_summary:
-                            gift_summary[key] = {"price": p["price"], "count": 0}
-                        gift_summary[key]["count"] += 1
-
-                    gift_items = list(gift_summary.items())
-                    for idx, (gid, data) in enumerate(gift_items):
-                        prefix = "   └" if idx == len(gift_items) - 1 else "   ├"
-                        summary_lines.append(
-                            f"{prefix} {data['price']:,} ★ × {data['count']}"
-                        )
-                    report_message_lines += summary_lines
-
-                    logger.warning(f"Профиль #{profile_index+1} не завершён")
-                    progress_made = True
-                    await refresh_balance(bot)
-                    continue  # К следующему профилю
+                        if use_redis:
+                            await set_profile_done(USER_ID, profile_index)
+
+                        report_message_lines += _format_profile_report(profile, profile_index, purchases, "done", USER_ID)
+
+                        logger.info(f"Профиль #{profile_index+1} завершён")
+                        progress_made = True
+                        await refresh_balance(bot)
+                        continue  # К следующему профилю
+
+                    # Если ничего не куплено — баланс/лимит/подарки кончились
+                    if (profile["BOUGHT"] < COUNT or profile["SPENT"] < LIMIT) and not profile["DONE"] and made_local_progress:
+                        report_message_lines += _format_profile_report(profile, profile_index, purchases, "partial", USER_ID)
+
+                        logger.warning(f"Профиль #{profile_index+1} не завершён")
+                        progress_made = True
+                        await refresh_balance(bot)
+                        continue  # К следующему профилю
+                finally:
+                    if use_redis:
+                        await release_profile_lock(USER_ID, profile_index)
 
             if not any_success and not progress_made:
                 logger.warning(
@@ -283,8 +316,23 @@ async def gift_purchase_worker(bot: Bot) -> None:
                     bot=bot, chat_id=USER_ID, user_id=USER_ID, message_id=message.message_id
                 )
 
-        except Exception as e:
-            logger.error(f"Ошибка в gift_purchase_worker: {e}")
+            fail_count = 0  # Проход завершился без ошибок
+
+        except TelegramRetryAfter as e:
+            logger.warning(f"Flood wait в gift_purchase_worker: ждём {e.retry_after} секунд")
+            await asyncio.sleep(e.retry_after)
+            continue
+
+        except (TelegramNetworkError, asyncio.TimeoutError) as e:
+            # Экспоненциальная пауза при повторяющихся сетевых сбоях
+            fail_count += 1
+            delay = min(60, DEFAULT_BOT_DELAY * (2 ** fail_count))
+            logger.error(f"Сетевая ошибка в gift_purchase_worker ({fail_count} подряд): {e}. Повтор через {delay} секунд...")
+            await asyncio.sleep(delay)
+            continue
+
+        except Exception:
+            logger.exception("Ошибка в gift_purchase_worker")
 
         await asyncio.sleep(DEFAULT_BOT_DELAY)
 
@@ -323,21 +371,23 @@ async def main() -> None:
     # Настройка Redis, если указано в переменных окружения
     redis_host = get_env_variable("REDIS_HOST", "localhost")
     redis_port = int(get_env_variable("REDIS_PORT", 6379))
-    set_redis_config(redis_host, redis_port)
+    await configure_redis(redis_host, redis_port)
+    if get_use_redis():
+        await warmup_redis()
 
     session = await get_aiohttp_session(USER_ID)
     bot = Bot(token=TOKEN, session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
     dp = Dispatcher(storage=MemoryStorage())
-    dp.message.middleware(RateLimitMiddleware(
-        commands_limits={"/start": 10, "/withdraw_all": 10, "/refund": 10}, 
+    # Один экземпляр на сообщения и колбэки: общие счётчики частоты для пользователя
+    rate_limit = RateLimitMiddleware(
+        commands_limits={"/start": 10, "/withdraw_all": 10, "/refund": 10, "guest_deposit_menu": 10},
         allowed_user_ids=ALLOWED_USER_IDS
-    ))
-    dp.callback_query.middleware(RateLimitMiddleware(
-        commands_limits={"guest_deposit_menu": 10},
-        allowed_user_ids=ALLOWED_USER_IDS
-    ))
-    dp.message.middleware(AccessControlMiddleware(ALLOWED_USER_IDS))
-    dp.callback_query.middleware(AccessControlMiddleware(ALLOWED_USER_IDS))
+    )
+    access_control = AccessControlMiddleware(ALLOWED_USER_IDS)
+    dp.message.middleware(rate_limit)
+    dp.callback_query.middleware(rate_limit)
+    dp.message.middleware(access_control)
+    dp.callback_query.middleware(access_control)
 
     # Простая защита: отключение громоздких traceback'ов SecurityCheckMismatch
     def _loop_exception_handler(loop, context):
@@ -379,7 +429,11 @@ async def main() -> None:
         factor=2.0,
         jitter=0.2
     )
-    await dp.start_polling(bot, backoff_config=backoff_config)
+    try:
+        await dp.start_polling(bot, backoff_config=backoff_config)
+    finally:
+        # Дописываем отложенные изменения конфига перед выходом
+        await flush_config()
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO, stream=sys.stdout)
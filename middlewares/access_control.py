@@ -12,6 +12,7 @@
 
 # --- Стандартные библиотеки ---
 import logging
+from typing import Container
 
 # --- Сторонние библиотеки ---
 from aiogram import BaseMiddleware
@@ -27,9 +28,9 @@ class AccessControlMiddleware(BaseMiddleware):
     FREE_CALLBACKS = {"guest_deposit_menu"}
     FREE_STATES = {"ConfigWizard:guest_deposit_amount"}
 
-    def __init__(self, allowed_user_ids: list[int]) -> None:
+    def __init__(self, allowed_user_ids: Container[int]) -> None:
         """
-        :param allowed_user_ids: Список разрешённых user_id.
+        :param allowed_user_ids: Коллекция разрешённых user_id (лучше frozenset — проверка за O(1)).
         :param bot: Экземпляр бота.
         """
         self.allowed_user_ids = allowed_user_ids
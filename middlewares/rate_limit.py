@@ -12,6 +12,7 @@
 # --- Стандартные библиотеки ---
 import time
 import logging
+from typing import Container
 
 # --- Сторонние библиотеки ---
 from aiogram import BaseMiddleware
@@ -27,14 +28,14 @@ class RateLimitMiddleware(BaseMiddleware):
     Ограничение действует отдельно для каждой команды и пользователя.
     Пользователи из списка allowed_user_ids не ограничиваются.
     """
-    def __init__(self, commands_limits: dict = None, allowed_user_ids: list[int] = None) -> None:
+    def __init__(self, commands_limits: dict = None, allowed_user_ids: Container[int] = None) -> None:
         """
         :param commands_limits: Словарь с лимитами в формате {команда: интервал_в_секундах}
-        :param allowed_user_ids: Список user_id, которым разрешено игнорировать ограничения
+        :param allowed_user_ids: Коллекция user_id, которым разрешено игнорировать ограничения (лучше frozenset)
         """
         self.last_times = {}  # user_id -> {command: timestamp}
         self.commands_limits = commands_limits or {}  # command: seconds
-        self.allowed_user_ids = allowed_user_ids or []
+        self.allowed_user_ids = allowed_user_ids or frozenset()
 
     async def __call__(self, handler: callable, event: TelegramObject, data: dict) -> None:
         """
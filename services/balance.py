@@ -15,13 +15,14 @@
 """
 
 # --- Стандартные библиотеки ---
-from itertools import combinations
+import asyncio
 import logging
+import time
 from typing import Callable, Awaitable, Any
 
 # --- Внутренние модули ---
 from services.config import load_config, save_config
-from services.userbot import get_userbot_stars_balance
+from services.userbot import get_userbot_stars_balance, invalidate_userbot_stars_cache
 
 # --- Сторонние библиотеки ---
 from aiogram import Bot
@@ -29,15 +30,27 @@ from aiogram.types.star_amount import StarAmount
 
 logger = logging.getLogger(__name__)
 
-async def get_stars_balance(bot: Bot) -> int:
+BALANCE_CACHE_TTL = 3.0 # Время жизни кеша баланса (в секундах)
+_balance_cache = {"value": None, "ts": 0.0} # Кеш баланса бота
+
+
+async def get_stars_balance(bot: Bot, force: bool = False) -> int:
     """
     Получает текущий баланс звёзд через API бота.
+    Повторные вызовы в течение BALANCE_CACHE_TTL секунд возвращают закешированное значение.
     :param bot: Экземпляр бота
+    :param force: Игнорировать кеш и запросить баланс заново
     :return: Баланс звёзд (int)
     """
+    now = time.monotonic()
+    if not force and _balance_cache["value"] is not None and now - _balance_cache["ts"] < BALANCE_CACHE_TTL:
+        return _balance_cache["value"]
+
     star_amount: StarAmount = await bot.get_my_star_balance()
     balance = star_amount.amount
 
+    _balance_cache["value"] = balance
+    _balance_cache["ts"] = now
     return balance
 
 
@@ -71,10 +84,11 @@ async def get_stars_balance_by_transactions(bot: Bot) -> int:
     return balance
 
 
-async def refresh_balance(bot: Bot) -> int:
+async def refresh_balance(bot: Bot, force: bool = False) -> int:
     """
     Обновляет баланс звёзд в конфиге и возвращает актуальное значение.
     :param bot: Экземпляр бота
+    :param force: Игнорировать кеш балансов и запросить их заново
     :return: Баланс звёзд (int)
     """
     # Загрузка конфига
@@ -88,18 +102,24 @@ async def refresh_balance(bot: Bot) -> int:
         and userbot_data.get("PHONE")
     )
     if has_session:
-        try:
-            userbot_balance = await get_userbot_balance()
-            config["USERBOT"]["BALANCE"] = userbot_balance
-        except Exception as e:
-            config["USERBOT"]["BALANCE"] = 0
-            logger.error(f"Не удалось получить баланс userbot: {e}")
+        # Запросы балансов независимы — выполняем их параллельно
+        userbot_balance, balance = await asyncio.gather(
+            get_userbot_balance(force=force),
+            get_stars_balance(bot, force=force),
+            return_exceptions=True
+        )
+        if isinstance(userbot_balance, BaseException):
+            logger.error(f"Не удалось получить баланс userbot: {userbot_balance}")
+            userbot_balance = 0
+        if isinstance(balance, BaseException):
+            raise balance
+        config["USERBOT"]["BALANCE"] = userbot_balance
     else:
         logger.info("Userbot-сессия неактивна или не настроена.")
         config["USERBOT"]["BALANCE"] = 0
+        balance = await get_stars_balance(bot, force=force)
 
     # Баланс основного бота
-    balance = await get_stars_balance(bot)
     config["BALANCE"] = balance
 
     # Сохраняем всё
@@ -115,6 +135,7 @@ async def change_balance(delta: int) -> int:
     """
     config = await load_config()
     config["BALANCE"] = max(0, config.get("BALANCE", 0) + delta)
+    _balance_cache["ts"] = 0.0
     balance = config["BALANCE"]
     await save_config(config)
     return balance
@@ -132,6 +153,7 @@ async def change_balance_userbot(delta: int) -> int:
     new_balance = max(0, current + delta)
 
     config["USERBOT"]["BALANCE"] = new_balance
+    invalidate_userbot_stars_cache()
     await save_config(config)
     return new_balance
 
@@ -151,7 +173,7 @@ async def refund_all_star_payments(
     :param message_func: Функция для отправки сообщений пользователю (опционально)
     :return: Словарь с результатами возврата
     """
-    balance = await refresh_balance(bot)
+    balance = await refresh_balance(bot, force=True)
     if balance <= 0:
         return {"refunded": 0, "count": 0, "txn_ids": [], "left": 0}
 
@@ -183,16 +205,25 @@ async def refund_all_star_payments(
 
     # Ищем идеальную комбинацию или greedy
     if n <= 18:
-        for r in range(1, n+1):
-            for combo in combinations(unrefunded_deposits, r):
-                s = sum(t.amount for t in combo)
-                if s <= balance and s > best_sum:
-                    best_combo = combo
-                    best_sum = s
+        # Перебор всех подмножеств в порядке кода Грея: на каждом шаге
+        # меняется ровно один бит, поэтому сумма обновляется за O(1)
+        amounts = [t.amount for t in unrefunded_deposits]
+        best_mask = 0
+        mask = 0
+        s = 0
+        for g in range(1, 1 << n):
+            i = (g & -g).bit_length() - 1
+            mask ^= 1 << i
+            if mask >> i & 1:
+                s += amounts[i]
+            else:
+                s -= amounts[i]
+            if s <= balance and s > best_sum:
+                best_mask = mask
+                best_sum = s
                 if best_sum == balance:
                     break
-            if best_sum == balance:
-                break
+        best_combo = [unrefunded_deposits[i] for i in range(n) if best_mask >> i & 1]
     else:
         unrefunded_deposits.sort(key=lambda t: t.amount, reverse=True)
         curr_sum = 0
@@ -249,9 +280,11 @@ async def refund_all_star_payments(
     }
 
 
-async def get_userbot_balance() -> int:
+async def get_userbot_balance(force: bool = False) -> int:
     """
     Получает баланс звёзд у userbot-сессии.
+    Значение кешируется на стороне userbot-а (см. get_userbot_stars_balance).
+    :param force: Игнорировать кеш и запросить баланс заново
     :return: Баланс юзербота (int)
     """
-    return await get_userbot_stars_balance()
+    return await get_userbot_stars_balance(force=force)
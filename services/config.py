@@ -10,7 +10,9 @@
 Основные функции:
 - ensure_config: Гарантирует существование config.json.
 - load_config: Загружает конфиг из файла.
-- save_config: Сохраняет конфиг в файл.
+- save_config: Сохраняет конфиг в файл (сразу или с отложенной записью).
+- flush_config: Дописывает на диск отложенные изменения конфига.
+- update_config_value: Меняет одно поле свежего конфига без перезаписи остальных.
 - validate_config: Валидирует глобальный конфиг и профили.
 - get_valid_config: Загружает и валидирует конфиг.
 - migrate_config_if_needed: Мигрирует конфиг в новый формат.
@@ -18,16 +20,28 @@
 """
 
 # --- Стандартные библиотеки ---
+import asyncio
 import json
 import os
 import logging
-from typing import Optional
+from typing import Any, Optional
 
 # --- Сторонние библиотеки ---
-import aiofiles
+try:
+    import orjson
+except ImportError:  # orjson необязателен — используем стандартный json
+    orjson = None  # type: ignore[assignment]
 
 logger = logging.getLogger(__name__)
 
+# Кеш содержимого конфигов: путь -> {"stamp": (mtime_ns, size), "data": bytes, "valid": bool, "dirty": bool}
+# Файл перечитывается только при изменении mtime/размера, "valid" — прошёл ли он валидацию,
+# "dirty" — данные ещё не записаны на диск (такая запись в кеше главнее файла)
+_CONFIG_CACHE: dict[str, dict] = {}
+_CONFIG_WRITE_LOCK = asyncio.Lock() # Последовательная запись конфигов на диск
+_PENDING_FLUSHES: dict[str, asyncio.Task] = {} # Запланированные отложенные записи
+CONFIG_FLUSH_DELAY = 0.2 # Задержка отложенной записи конфига (в секундах)
+
 CURRENCY = 'XTR' # Валюта приложения
 VERSION = '1.5.0' # Версия приложения
 CONFIG_PATH = "config.json" # Путь к файлу конфигурации
@@ -40,7 +54,7 @@ USE_PROXY_USERBOT = False # Использовать прокси для юзе
 USE_REDIS = False # Использовать Redis для кэша подарков.
 REDIS_HOST = "localhost"  # Адрес Redis сервера
 REDIS_PORT = 6379  # Порт Redis сервера
-ALLOWED_USER_IDS = []  # Список разрешённых пользователей (Beta-версия, не рекомендуется использовать больше одного пользователя в продакшене)
+ALLOWED_USER_IDS: frozenset[int] = frozenset()  # Множество разрешённых пользователей (Beta-версия, не рекомендуется использовать больше одного пользователя в продакшене)
 DEFAULT_BOT_DELAY = 1.0  # Задержка бота по умолчанию
 
 # Профиль для получения полного списка лимитных подарков
@@ -75,14 +89,15 @@ def add_allowed_user(user_id: int) -> None:
     Добавляет пользователя в список разрешённых.
     :param user_id: ID пользователя
     """
-    ALLOWED_USER_IDS.append(user_id)
+    global ALLOWED_USER_IDS
+    ALLOWED_USER_IDS = ALLOWED_USER_IDS | {user_id}
     logger.info(f"Пользователь {user_id} добавлен в список разрешённых.")
 
 
-def get_allowed_users() -> list[int]:
+def get_allowed_users() -> frozenset[int]:
     """
-    Возвращает список разрешённых пользователей.
-    :return: Список ID разрешённых пользователей
+    Возвращает множество разрешённых пользователей.
+    :return: Множество ID разрешённых пользователей
     """
     return ALLOWED_USER_IDS
 
@@ -212,7 +227,7 @@ def DEFAULT_CONFIG(user_id: int) -> dict:
 
 
 # Типы и требования для каждого поля профиля
-PROFILE_TYPES = {
+PROFILE_TYPES: dict[str, tuple[type, bool]] = {
     "NAME": (str, True),
     "MIN_PRICE": (int, False),
     "MAX_PRICE": (int, False),
@@ -231,7 +246,7 @@ PROFILE_TYPES = {
 
 
 # Типы и требования для глобальных полей
-CONFIG_TYPES = {
+CONFIG_TYPES: dict[str, tuple[type, bool]] = {
     "BALANCE": (int, False),
     "ACTIVE": (bool, False),
     "DEPOSIT_ENBALE": (bool, False),
@@ -240,6 +255,16 @@ CONFIG_TYPES = {
     "USERBOT": (dict, False)
 }
 
+# Плоские кортежи (ключ, тип, допускается ли None) для циклов валидации
+_PROFILE_TYPES_TUP: tuple[tuple[str, type, bool], ...] = tuple(
+    (key, expected_type, allow_none) for key, (expected_type, allow_none) in PROFILE_TYPES.items()
+)
+_CONFIG_TYPES_TUP: tuple[tuple[str, type, bool], ...] = tuple(
+    (key, expected_type, allow_none) for key, (expected_type, allow_none) in CONFIG_TYPES.items()
+)
+
+_MISSING = object() # Маркер отсутствующего ключа
+
 
 def is_valid_type(value: object, expected_type: type, allow_none: bool = False) -> bool:
     """
@@ -254,6 +279,152 @@ def is_valid_type(value: object, expected_type: type, allow_none: bool = False)
     return isinstance(value, expected_type)
 
 
+def _json_dumps(data: object) -> bytes:
+    """
+    Сериализует данные в JSON (UTF-8, отступ 2 пробела).
+    Использует orjson, если он установлен.
+    :param data: Сериализуемые данные
+    :return: JSON в виде байтов
+    """
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8")
+
+
+def _json_loads(data: bytes | str) -> Any:
+    """
+    Разбирает JSON из байтов или строки.
+    Использует orjson, если он установлен.
+    :param data: JSON в виде байтов или строки
+    :return: Разобранные данные
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _read_sync(path: str) -> bytes:
+    """
+    Читает файл целиком (блокирующая операция, вызывается через asyncio.to_thread).
+    :param path: Путь к файлу
+    :return: Содержимое файла
+    """
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _write_sync(path: str, data: bytes) -> None:
+    """
+    Атомарно записывает файл целиком (блокирующая операция, вызывается через asyncio.to_thread).
+    Данные пишутся во временный файл, который затем заменяет исходный через os.replace,
+    поэтому при сбое на диске остаётся либо старый, либо новый конфиг целиком.
+    :param path: Путь к файлу
+    :param data: Содержимое файла
+    """
+    tmp_path = f"{path}.tmp"
+    # Без буферизации: готовый payload уходит на диск одним вызовом write()
+    with open(tmp_path, "wb", buffering=0) as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _file_stamp(path: str) -> tuple[int, int] | None:
+    """
+    Возвращает отметку состояния файла для проверки актуальности кеша.
+    :param path: Путь к файлу
+    :return: Кортеж (mtime_ns, size) или None, если файла нет
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+async def _read_config_bytes(path: str) -> bytes:
+    """
+    Возвращает содержимое конфига, читая файл с диска только если он изменился.
+    :param path: Путь к файлу конфигурации
+    :return: Содержимое файла
+    """
+    entry = _CONFIG_CACHE.get(path)
+    if entry is not None and entry["dirty"]:
+        return entry["data"]
+    stamp = _file_stamp(path)
+    if stamp is None:
+        raise FileNotFoundError(f"Файл {path} не найден. Используйте ensure_config.")
+    if entry is not None and entry["stamp"] == stamp:
+        return entry["data"]
+    data = await asyncio.to_thread(_read_sync, path)
+    current = _CONFIG_CACHE.get(path)
+    if current is not entry:
+        # Пока шло чтение, кеш обновился (сохранение или другое чтение) — его данные свежее
+        return current["data"]
+    _CONFIG_CACHE[path] = {"stamp": stamp, "data": data, "valid": False, "dirty": False}
+    return data
+
+
+def _mark_config_dirty(path: str, data: bytes) -> None:
+    """
+    Кладёт новое содержимое конфига в кеш как ещё не записанное на диск.
+    Читатели сразу получают новые данные, запись выполняет _flush_config.
+    :param path: Путь к файлу конфигурации
+    :param data: Содержимое файла
+    """
+    entry = _CONFIG_CACHE.get(path)
+    stamp = entry["stamp"] if entry is not None else None
+    _CONFIG_CACHE[path] = {"stamp": stamp, "data": data, "valid": False, "dirty": True}
+
+
+async def _flush_config(path: str) -> None:
+    """
+    Записывает на диск последнее незаписанное содержимое конфига.
+    Записи выполняются по очереди, поэтому на диске всегда оказывается самая свежая версия.
+    :param path: Путь к файлу конфигурации
+    """
+    async with _CONFIG_WRITE_LOCK:
+        entry = _CONFIG_CACHE.get(path)
+        if entry is None or not entry["dirty"]:
+            return
+        await asyncio.to_thread(_write_sync, path, entry["data"])
+        # Если во время записи пришли новые данные — они остаются незаписанными,
+        # а отметка файла не переносится на них: она соответствует только записанной версии
+        if _CONFIG_CACHE.get(path) is entry:
+            entry["stamp"] = _file_stamp(path)
+            entry["dirty"] = False
+
+
+async def _flush_config_later(path: str, delay: float) -> None:
+    """
+    Отложенная запись конфига: все сохранения за время задержки попадают на диск одной записью.
+    :param path: Путь к файлу конфигурации
+    :param delay: Задержка перед записью (в секундах)
+    """
+    try:
+        await asyncio.sleep(delay)
+    finally:
+        _PENDING_FLUSHES.pop(path, None)
+    await _flush_config(path)
+
+
+async def _write_config_bytes(path: str, data: bytes) -> None:
+    """
+    Записывает конфиг на диск и обновляет кеш.
+    :param path: Путь к файлу конфигурации
+    :param data: Содержимое файла
+    """
+    _mark_config_dirty(path, data)
+    await _flush_config(path)
+
+
+async def flush_config(path: str = CONFIG_PATH) -> None:
+    """
+    Дописывает на диск отложенные изменения конфига (например, при остановке бота).
+    :param path: Путь к файлу конфигурации
+    """
+    await _flush_config(path)
+
+
 async def ensure_config(user_id: int, path: str = CONFIG_PATH):
     """
     Гарантирует существование config.json.
@@ -261,8 +432,7 @@ async def ensure_config(user_id: int, path: str = CONFIG_PATH):
     :param path: Путь к файлу конфигурации
     """
     if not os.path.exists(path):
-        async with aiofiles.open(path, mode="w", encoding="utf-8") as f:
-            await f.write(json.dumps(DEFAULT_CONFIG(user_id), indent=2))
+        await _write_config_bytes(path, _json_dumps(DEFAULT_CONFIG(user_id)))
         logger.info(f"Создана конфигурация: {path}")
 
 
@@ -272,91 +442,166 @@ async def load_config(path: str = CONFIG_PATH) -> dict:
     :param path: Путь к файлу конфигурации
     :return: Словарь конфигурации
     """
-    if not os.path.exists(path):
-        raise FileNotFoundError(f"Файл {path} не найден. Используйте ensure_config.")
-    async with aiofiles.open(path, mode="r", encoding="utf-8") as f:
-        data = await f.read()
-        return json.loads(data)
+    data = await _read_config_bytes(path)
+    return _json_loads(data)
 
 
-async def save_config(config: dict, path: str = CONFIG_PATH):
+async def save_config(config: dict, path: str = CONFIG_PATH, delay: float = 0.0):
     """
     Сохраняет конфиг в файл.
+    При delay > 0 запись откладывается: конфиг сразу доступен из кеша,
+    а несколько сохранений подряд сливаются в одну запись на диск.
     :param config: Словарь конфигурации
     :param path: Путь к файлу
+    :param delay: Задержка записи на диск (в секундах), 0 — записать сразу
     """
-    async with aiofiles.open(path, mode="w", encoding="utf-8") as f:
-        await f.write(json.dumps(config, indent=2))
+    data = _json_dumps(config)
+    if delay > 0:
+        _mark_config_dirty(path, data)
+        _schedule_flush(path, delay)
+        return
+    await _write_config_bytes(path, data)
     logger.info(f"Конфигурация сохранена.")
 
 
-async def validate_profile(profile: dict, user_id: Optional[int] = None) -> dict:
+def _schedule_flush(path: str, delay: float) -> None:
     """
-    Валидирует один профиль.
-    :param profile: Словарь профиля
-    :param user_id: ID пользователя
-    :return: Валидированный профиль
+    Планирует отложенную запись конфига, если она ещё не запланирована.
+    :param path: Путь к файлу конфигурации
+    :param delay: Задержка записи на диск (в секундах)
     """
-    valid = {}
-    default = DEFAULT_PROFILE(user_id or 0)
-    for key, (expected_type, allow_none) in PROFILE_TYPES.items():
-        if key not in profile or not is_valid_type(profile[key], expected_type, allow_none):
-            valid[key] = default[key]
-        else:
-            valid[key] = profile[key]
-    return valid
+    if path not in _PENDING_FLUSHES:
+        _PENDING_FLUSHES[path] = asyncio.create_task(_flush_config_later(path, delay))
+
+
+async def update_config_value(key: str, value: Any, path: str = CONFIG_PATH, delay: float = 0.0) -> None:
+    """
+    Меняет одно поле конфига: перечитывает актуальный конфиг под блокировкой записи
+    и сохраняет его с новым значением. Остальные поля (например, счётчики BOUGHT/SPENT,
+    которые воркер мог сохранить только что) не затираются устаревшим снимком.
+    :param key: Ключ верхнего уровня
+    :param value: Новое значение
+    :param path: Путь к файлу конфигурации
+    :param delay: Задержка записи на диск (в секундах), 0 — записать сразу
+    """
+    async with _CONFIG_WRITE_LOCK:
+        config = await load_config(path)
+        config[key] = value
+        _mark_config_dirty(path, _json_dumps(config))
+    if delay > 0:
+        _schedule_flush(path, delay)
+    else:
+        await _flush_config(path)
 
 
-async def validate_config(config: dict, user_id: int) -> dict:
+def validate_profile(profile: dict, user_id: Optional[int] = None) -> tuple[dict, bool]:
     """
-    Валидирует глобальный конфиг и все профили.
+    Валидирует один профиль на месте: недостающие и некорректные поля
+    заменяются значениями по умолчанию, лишние поля удаляются.
+    :param profile: Словарь профиля
+    :param user_id: ID пользователя
+    :return: Кортеж (валидированный профиль, были ли изменения)
+    """
+    changed = False
+    default: Optional[dict] = None
+    for key, expected_type, allow_none in _PROFILE_TYPES_TUP:
+        value = profile.get(key, _MISSING)
+        if value is _MISSING or not is_valid_type(value, expected_type, allow_none):
+            if default is None:
+                default = DEFAULT_PROFILE(user_id or 0)
+            profile[key] = default[key]
+            changed = True
+    if len(profile) != len(PROFILE_TYPES):
+        for key in [k for k in profile if k not in PROFILE_TYPES]:
+            del profile[key]
+        changed = True
+    return profile, changed
+
+
+def validate_config(config: dict, user_id: int) -> tuple[dict, bool]:
+    """
+    Валидирует глобальный конфиг и все профили на месте.
     :param config: Словарь конфигурации
     :param user_id: ID пользователя
-    :return: Валидированный конфиг
+    :return: Кортеж (валидированный конфиг, были ли изменения)
     """
-    valid = {}
-    default = DEFAULT_CONFIG(user_id)
+    changed = False
+    default: Optional[dict] = None
     # Верхний уровень
-    for key, (expected_type, allow_none) in CONFIG_TYPES.items():
+    for key, expected_type, allow_none in _CONFIG_TYPES_TUP:
         if key == "PROFILES":
-            profiles = config.get("PROFILES", [])
+            profiles = config.get("PROFILES")
+            if not isinstance(profiles, list):
+                profiles = []
+                changed = True
             # Валидация профилей
-            valid_profiles = []
-            for profile in profiles:
-                valid_profiles.append(await validate_profile(profile, user_id))
-            if not valid_profiles:
-                valid_profiles = [DEFAULT_PROFILE(user_id)]
-            valid["PROFILES"] = valid_profiles
+            for idx, profile in enumerate(profiles):
+                if not isinstance(profile, dict):
+                    profiles[idx] = DEFAULT_PROFILE(user_id)
+                    changed = True
+                    continue
+                _, profile_changed = validate_profile(profile, user_id)
+                changed = changed or profile_changed
+            if not profiles:
+                profiles.append(DEFAULT_PROFILE(user_id))
+                changed = True
+            config["PROFILES"] = profiles
         elif key == "USERBOT":
-            userbot_data = config.get("USERBOT", {})
+            userbot_data = config.get("USERBOT")
+            if not isinstance(userbot_data, dict):
+                userbot_data = {}
+                changed = True
+            if default is None:
+                default = DEFAULT_CONFIG(user_id)
             default_userbot = default["USERBOT"]
-            valid_userbot = {}
             for sub_key, default_value in default_userbot.items():
-                value = userbot_data.get(sub_key, default_value)
-                valid_userbot[sub_key] = value
-            valid["USERBOT"] = valid_userbot
+                if sub_key not in userbot_data:
+                    userbot_data[sub_key] = default_value
+                    changed = True
+            if len(userbot_data) != len(default_userbot):
+                for sub_key in [k for k in userbot_data if k not in default_userbot]:
+                    del userbot_data[sub_key]
+                changed = True
+            config["USERBOT"] = userbot_data
         else:
-            if key not in config or not is_valid_type(config[key], expected_type, allow_none):
-                valid[key] = default[key]
-            else:
-                valid[key] = config[key]
-    return valid
+            value = config.get(key, _MISSING)
+            if value is _MISSING or not is_valid_type(value, expected_type, allow_none):
+                if default is None:
+                    default = DEFAULT_CONFIG(user_id)
+                config[key] = default[key]
+                changed = True
+    if len(config) != len(CONFIG_TYPES):
+        for key in [k for k in config if k not in CONFIG_TYPES]:
+            del config[key]
+        changed = True
+    return config, changed
 
 
 async def get_valid_config(user_id: int, path: str = CONFIG_PATH) -> dict:
     """
     Загружает, валидирует и при необходимости обновляет config.json.
+    Если файл не менялся с прошлой валидации, конфиг берётся из кеша в памяти.
     :param user_id: ID пользователя
     :param path: Путь к файлу конфигурации
     :return: Валидированный конфиг
     """
     await ensure_config(user_id, path)
+
+    # Файл не менялся с прошлой валидации — отдаём свежую копию из кеша
+    entry = _CONFIG_CACHE.get(path)
+    if entry is not None and entry["valid"] and (entry["dirty"] or entry["stamp"] == _file_stamp(path)):
+        return _json_loads(entry["data"])
+
     config = await load_config(path)
-    validated = await validate_config(config, user_id)
-    # Если валидированная версия отличается, сохранить
-    if validated != config:
-        await save_config(validated, path)
-    return validated
+    config, changed = validate_config(config, user_id)
+    # Сохраняем, только если валидация что-то исправила и байты на диске действительно отличаются
+    if changed:
+        data = _json_dumps(config)
+        if data != _CONFIG_CACHE[path]["data"]:
+            await _write_config_bytes(path, data)
+            logger.info(f"Конфигурация сохранена.")
+    _CONFIG_CACHE[path]["valid"] = True
+    return config
 
 
 async def migrate_config_if_needed(user_id: int, path: str = CONFIG_PATH):
@@ -370,9 +615,8 @@ async def migrate_config_if_needed(user_id: int, path: str = CONFIG_PATH):
         return
 
     try:
-        async with aiofiles.open(path, "r", encoding="utf-8") as f:
-            data = await f.read()
-            config = json.loads(data)
+        data = await asyncio.to_thread(_read_sync, path)
+        config = _json_loads(data)
     except Exception:
         logger.error(f"Конфиг {path} повреждён.")
         os.remove(path)
@@ -409,32 +653,30 @@ async def migrate_config_if_needed(user_id: int, path: str = CONFIG_PATH):
         "PROFILES": [profile],
     }
 
-    async with aiofiles.open(path, "w", encoding="utf-8") as f:
-        await f.write(json.dumps(new_config, ensure_ascii=False, indent=2))
+    await _write_config_bytes(path, _json_dumps(new_config))
     logger.info(f"Конфиг {path} мигрирован в новый формат.")
 
 
-async def update_config_from_env(path: str = CONFIG_PATH, config_data: str = None):
+async def update_config_from_env(path: str = CONFIG_PATH, config_data: Optional[str] = None):
     """
     Обновляет конфиг из переменной среды CONFIG_DATA.
     :param path: Путь к файлу конфигурации
     :param config_data: Данные конфигурации в формате JSON
     """
     try:
-        config_dict = json.loads(config_data)
+        config_dict = _json_loads(config_data or "")
     except Exception as e:
         logger.error(f"CONFIG_DATA не является валидным JSON: {e}")
         return
 
     try:
-        async with aiofiles.open(path, mode="w", encoding="utf-8") as f:
-            await f.write(json.dumps(config_dict, indent=2, ensure_ascii=False))
+        await _write_config_bytes(path, _json_dumps(config_dict))
         logger.info(f"Конфиг успешно обновлён из переменной среды CONFIG_DATA.")
     except Exception as e:
         logger.error(f"Ошибка при сохранении конфига из CONFIG_DATA: {e}")
 
 
-async def get_profile(config: dict, index: int = 0) -> dict:
+def get_profile(config: dict, index: int = 0) -> dict:
     """
     Получить профиль по индексу (по умолчанию первый).
     :param config: Словарь конфигурации
@@ -447,6 +689,49 @@ async def get_profile(config: dict, index: int = 0) -> dict:
     return profiles[index]
 
 
+def _add_profile_inplace(config: dict, profile: dict) -> dict:
+    """
+    Добавляет новый профиль в конфиг (без сохранения).
+    :param config: Словарь конфигурации
+    :param profile: Новый профиль
+    :return: Обновлённый конфиг
+    """
+    config.setdefault("PROFILES", []).append(profile)
+    return config
+
+
+def _update_profile_inplace(config: dict, index: int, new_profile: dict) -> dict:
+    """
+    Обновляет профиль по индексу (без сохранения).
+    :param config: Словарь конфигурации
+    :param index: Индекс профиля
+    :param new_profile: Новый профиль
+    :return: Обновлённый конфиг
+    """
+    if "PROFILES" not in config or index >= len(config["PROFILES"]):
+        raise IndexError("Профиль не найден")
+    config["PROFILES"][index] = new_profile
+    return config
+
+
+def _remove_profile_inplace(config: dict, index: int, user_id: int) -> dict:
+    """
+    Удаляет профиль по индексу (без сохранения).
+    Если удалён последний профиль — добавляет дефолтный.
+    :param config: Словарь конфигурации
+    :param index: Индекс профиля
+    :param user_id: ID пользователя
+    :return: Обновлённый конфиг
+    """
+    if "PROFILES" not in config or index >= len(config["PROFILES"]):
+        raise IndexError("Профиль не найден")
+    config["PROFILES"].pop(index)
+    if not config["PROFILES"]:
+        # Добавить дефолтный если удалили все
+        config["PROFILES"].append(DEFAULT_PROFILE(user_id))
+    return config
+
+
 async def add_profile(config: dict, profile: dict, save: bool = True) -> dict:
     """
     Добавляет новый профиль в конфиг.
@@ -455,7 +740,7 @@ async def add_profile(config: dict, profile: dict, save: bool = True) -> dict:
     :param save: Сохранять ли конфиг
     :return: Обновлённый конфиг
     """
-    config.setdefault("PROFILES", []).append(profile)
+    _add_profile_inplace(config, profile)
     if save:
         await save_config(config)
     return config
@@ -470,9 +755,7 @@ async def update_profile(config: dict, index: int, new_profile: dict, save: bool
     :param save: Сохранять ли конфиг
     :return: Обновлённый конфиг
     """
-    if "PROFILES" not in config or index >= len(config["PROFILES"]):
-        raise IndexError("Профиль не найден")
-    config["PROFILES"][index] = new_profile
+    _update_profile_inplace(config, index, new_profile)
     if save:
         await save_config(config)
     return config
@@ -487,12 +770,7 @@ async def remove_profile(config: dict, index: int, user_id: int, save: bool = Tr
     :param save: Сохранять ли конфиг
     :return: Обновлённый конфиг
     """
-    if "PROFILES" not in config or index >= len(config["PROFILES"]):
-        raise IndexError("Профиль не найден")
-    config["PROFILES"].pop(index)
-    if not config["PROFILES"]:
-        # Добавить дефолтный если удалили все
-        config["PROFILES"].append(DEFAULT_PROFILE(user_id))
+    _remove_profile_inplace(config, index, user_id)
     if save:
         await save_config(config)
     return config
@@ -504,17 +782,60 @@ async def get_deposit_enabled() -> bool:
     Если конфиг отсутствует или параметр не найден — возвращает False.
     :return: True если депозит включён, иначе False
     """
-    if not os.path.exists(CONFIG_PATH):
+    try:
+        config = await load_config(CONFIG_PATH)
+    except Exception:
         return False
-    async with aiofiles.open(CONFIG_PATH, mode="r", encoding="utf-8") as f:
-        data = await f.read()
-        try:
-            config = json.loads(data)
-        except Exception:
-            return False
     return bool(config.get("DEPOSIT_ENBALE", False))
 
 
+# Шаблон блока профиля в главном меню
+_PROFILE_TEMPLATE = (
+    "\n"
+    "┌🏷️ <b>{name}</b>{userbot_state}{state}\n"
+    "├💰 <b>Цена</b>: {min_price:,} – {max_price:,} ★\n"
+    "├📦 <b>Саплай</b>: {min_supply:,} – {max_supply:,}\n"
+    "├🎁 <b>Куплено</b>: {bought:,} / {count:,}\n"
+    "├⭐️ <b>Лимит</b>: {spent:,} / {limit:,} ★\n"
+    "├👤 <b>Получатель</b>: {target}\n"
+    "└📤 <b>Отправитель</b>: {sender}"
+)
+
+
+def _format_profile_block(profile: dict, idx: int, user_id: int, userbot_muted: bool) -> str:
+    """
+    Формирует блок одного профиля для главного меню.
+    Все поля профиля гарантированы validate_profile — читаем их напрямую.
+    :param profile: Словарь профиля
+    :param idx: Номер профиля (с 1)
+    :param user_id: ID пользователя для отображения "Вы"
+    :param userbot_muted: Юзербот выключен или не подключён
+    :return: HTML-текст блока профиля
+    """
+    sender_type = profile['SENDER']
+    spent = profile['SPENT']
+    state_profile = (
+        " ✅ <b>(завершён)</b>" if profile['DONE']
+        else " ⚠️ <b>(частично)</b>" if spent > 0
+        else ""
+    )
+    return _PROFILE_TEMPLATE.format_map({
+        "name": profile['NAME'] or f'Профиль {idx}',
+        "userbot_state": ' 🔕' if sender_type == 'userbot' and userbot_muted else '',
+        "state": state_profile,
+        "min_price": profile['MIN_PRICE'],
+        "max_price": profile['MAX_PRICE'],
+        "min_supply": profile['MIN_SUPPLY'],
+        "max_supply": profile['MAX_SUPPLY'],
+        "bought": profile['BOUGHT'],
+        "count": profile['COUNT'],
+        "spent": spent,
+        "limit": profile['LIMIT'],
+        "target": get_target_display(profile, user_id),
+        "sender": '<code>Бот</code>' if sender_type == 'bot' else '<code>Юзербот</code>',
+    })
+
+
 def format_config_summary(config: dict, user_id: int) -> str:
     """
     Формирует текст для главного меню: статус, баланс, и список всех профилей (каждый с кратким описанием).
@@ -529,44 +850,25 @@ def format_config_summary(config: dict, user_id: int) -> str:
     userbot_balance = userbot.get("BALANCE", 0)
     session_state = True if userbot.get("API_ID") and userbot.get("API_HASH") and userbot.get("PHONE") else False
 
-    lines = [f"🚦 <b>Статус:</b> {status_text}"]
-    for idx, profile in enumerate(profiles, 1):
-        target_display = get_target_display(profile, user_id)
-        sender = '<code>Бот</code>' if profile['SENDER'] == 'bot' else f'<code>Юзербот</code>'
-        profile_name = f'Профиль {idx}' if  not profile['NAME'] else profile['NAME']
-        state_profile = (
-            " ✅ <b>(завершён)</b>" if profile.get('DONE')
-            else " ⚠️ <b>(частично)</b>" if profile.get('SPENT', 0) > 0
-            else ""
-        )
-        userbot_state_profile = ' 🔕' if profile['SENDER'] == 'userbot' and (not session_state or userbot.get('ENABLED') == False) else ''
-        line = (
-            "\n"
-            f"┌🏷️ <b>{profile_name}</b>{userbot_state_profile}{state_profile}\n"
-            f"├💰 <b>Цена</b>: {profile.get('MIN_PRICE'):,} – {profile.get('MAX_PRICE'):,} ★\n"
-            f"├📦 <b>Саплай</b>: {profile.get('MIN_SUPPLY'):,} – {profile.get('MAX_SUPPLY'):,}\n"
-            f"├🎁 <b>Куплено</b>: {profile.get('BOUGHT'):,} / {profile.get('COUNT'):,}\n"
-            f"├⭐️ <b>Лимит</b>: {profile.get('SPENT'):,} / {profile.get('LIMIT'):,} ★\n"
-            f"├👤 <b>Получатель</b>: {target_display}\n"
-            f"└📤 <b>Отправитель</b>: {sender}"
-        )
-        lines.append(line)
-
-    # Баланс основного бота
-    lines.append(f"\n💰 <b>Баланс бота</b>: {balance:,} ★")
+    # Юзербот выключен или не подключён — одинаково для всех профилей
+    userbot_muted = not session_state or userbot.get('ENABLED') == False
 
     # Добавляем баланс userbot, если сессия активна
     if session_state:
-        lines.append(
+        userbot_line = (
             f"💰 <b>Баланс юзербота</b>: {userbot_balance:,} ★"
             f"{' 🔕' if not userbot.get('ENABLED') else ''}"
         )
     else:
-        lines.append(
-            f"💰 <b>Баланс юзербота</b>: Не подключён!"
-        )
+        userbot_line = f"💰 <b>Баланс юзербота</b>: Не подключён!"
 
-    return "\n".join(lines)
+    # Весь текст собирается одним join
+    return "\n".join([
+        f"🚦 <b>Статус:</b> {status_text}",
+        *(_format_profile_block(profile, idx, user_id, userbot_muted) for idx, profile in enumerate(profiles, 1)),
+        f"\n💰 <b>Баланс бота</b>: {balance:,} ★",
+        userbot_line
+    ])
 
 
 def get_target_display(profile: dict, user_id: int) -> str:
@@ -590,7 +892,7 @@ def get_target_display(profile: dict, user_id: int) -> str:
         return f"<code>{target_user_id}</code>"
     
 
-def get_target_display_local(target_user_id: int, target_chat_id: str, user_id: int) -> str:
+def get_target_display_local(target_user_id: Optional[int], target_chat_id: Optional[str], user_id: int) -> str:
     """
     Возвращает строковое описание получателя подарка на основе выбранного получателя и user_id.
     Если оба параметра равны None, возвращает пустую строку.
@@ -12,7 +12,9 @@
 """
 
 # --- Стандартные библиотеки ---
+import heapq
 import logging
+from operator import itemgetter
 
 # --- Сторонние библиотеки ---
 from aiogram import Bot
@@ -30,13 +32,14 @@ def normalize_gift(gift: object) -> dict:
     :param gift: Объект Gift (любой тип с нужными атрибутами).
     :return: Словарь с параметрами подарка.
     """
+    sticker = getattr(gift, "sticker", None)
     return {
         "id": getattr(gift, "id", None),
         "price": getattr(gift, "star_count", 0),
         "supply": getattr(gift, "total_count", 0) or 0,
         "left": getattr(gift, "remaining_count", 0) or 0,
-        "sticker_file_id": getattr(getattr(gift, "sticker", None), "file_id", None),
-        "emoji": getattr(getattr(gift, "sticker", None), "emoji", None),
+        "sticker_file_id": getattr(sticker, "file_id", None),
+        "emoji": getattr(sticker, "emoji", None),
     }
 
 
@@ -71,30 +74,30 @@ async def get_bot_filtered_gifts(
         logger.error(f"Ошибка при получении подарков из Bot API: {e}")
         return []
     
-    filtered = []
-    for gift in api_gifts.gifts:
-        price_ok = min_price <= gift.star_count <= max_price
-        # Логика по unlimited
-        if unlimited:
-            supply_ok = True
-        else:
-            supply = gift.total_count or 0
-            supply_ok = min_supply <= supply <= max_supply
-        if price_ok and supply_ok:
-            filtered.append(gift)
-    normalized = [normalize_gift(gift) for gift in filtered]
+    # Фильтрация и нормализация за один проход
+    normalized = [
+        normalize_gift(gift) for gift in api_gifts.gifts
+        if min_price <= gift.star_count <= max_price and (
+            unlimited or min_supply <= (gift.total_count or 0) <= max_supply
+        )
+    ]
+
+    normalized.sort(key=itemgetter("price"), reverse=True)
+
+    # Без тестовых подарков (обычный режим) — список уже готов
+    if not (add_test_gifts or DEV_MODE):
+        return normalized
 
     # Получаем и фильтруем тестовые подарки отдельно
-    test_gifts = []
-    if add_test_gifts or DEV_MODE:
-        test_gifts = generate_test_gifts(test_gifts_count)
-        test_gifts = [
-            gift for gift in test_gifts
-            if min_price <= gift["price"] <= max_price and (
-                unlimited or min_supply <= gift["supply"] <= max_supply
-            )
-        ]
+    test_gifts = [
+        gift for gift in generate_test_gifts(test_gifts_count)
+        if min_price <= gift["price"] <= max_price and (
+            unlimited or min_supply <= gift["supply"] <= max_supply
+        )
+    ]
+    if not test_gifts:
+        return normalized
 
-    all_gifts = normalized + test_gifts
-    all_gifts .sort(key=lambda g: g["price"], reverse=True)
-    return all_gifts
+    # Сливаем два уже отсортированных списка за O(N+M)
+    test_gifts.sort(key=itemgetter("price"), reverse=True)
+    return list(heapq.merge(normalized, test_gifts, key=itemgetter("price"), reverse=True))
@@ -10,7 +10,7 @@
 Основные функции:
 - userbot_gifts_updater: Фоновая задача для обновления кеша подарков от userbot.
 - is_userbot_cache_fresh: Проверяет, актуален ли кеш userbot.
-- filter_gifts_by_profile: Фильтрует список подарков по параметрам профиля.
+- filter_gifts_by_profile: Лениво фильтрует список подарков по параметрам профиля.
 - get_best_gift_list: Возвращает наиболее полный список подарков из доступных источников.
 """
 
@@ -19,6 +19,7 @@ import time
 import random
 import asyncio
 import logging
+from typing import Iterator
 
 # --- Сторонние библиотеки ---
 from aiogram import Bot
@@ -88,19 +89,21 @@ def is_userbot_cache_fresh(max_age: int = 55) -> bool:
     return time.time() - last_update_userbot < max_age
 
 
-def filter_gifts_by_profile(gifts: list[dict], profile: dict) -> list[dict]:
+def filter_gifts_by_profile(gifts: list[dict], profile: dict) -> Iterator[dict]:
     """
-    Фильтрует список подарков по параметрам конкретного профиля.
+    Лениво фильтрует список подарков по параметрам конкретного профиля.
+    Подарки перебираются по мере потребления, поэтому при досрочном выходе
+    из цикла покупок хвост списка не обрабатывается.
 
     :param gifts: Список всех доступных подарков (словари)
     :param profile: Словарь с параметрами профиля (ценовой диапазон, лимиты)
-    :return: Отфильтрованный список подарков, подходящих под профиль
+    :return: Итератор подарков, подходящих под профиль
     """
-    return [
+    return (
         g for g in gifts
         if profile["MIN_PRICE"] <= g.get("price", 0) <= profile["MAX_PRICE"]
         and profile["MIN_SUPPLY"] <= g.get("supply", 0) <= profile["MAX_SUPPLY"]
-    ]
+    )
 
 
 async def get_best_gift_list(user_id: int, bot: Bot, profile: dict) -> list[dict]:
@@ -144,7 +147,7 @@ async def get_best_gift_list(user_id: int, bot: Bot, profile: dict) -> list[dict
         logger.error(f"Ошибка получения списка подарков от бота: {e}")
         gifts_bot = []
 
-    gifts_userbot = filter_gifts_by_profile(userbot_all_gifts, profile)
+    gifts_userbot = list(filter_gifts_by_profile(userbot_all_gifts, profile))
 
     if is_userbot_cache_fresh(base_interval + 10) and len(gifts_userbot) > len(gifts_bot):
         return gifts_userbot
@@ -9,49 +9,94 @@
 
 Основные функции:
 - get_redis: Возвращает глобальный экземпляр клиента Redis.
+- configure_redis: Применяет новые настройки Redis и пересоздаёт клиент.
+- warmup_redis: Заранее открывает соединение с Redis.
 - normalize_gift: Преобразует объект Gift (словарь) в словарь с основными характеристиками.
 - get_redis_filtered_gifts: Получает и фильтрует список подарков из Redis.
 """
 
 # --- Стандартные библиотеки ---
+import heapq
 import json
 import logging
-import asyncio
+import time
+from operator import itemgetter
 
 # --- Сторонние библиотеки ---
 import redis.asyncio as redis
+try:
+    import orjson
+except ImportError:  # orjson необязателен — используем стандартный json
+    orjson = None
 
 # --- Внутренние модули ---
 from utils.mockdata import generate_test_gifts
-from services.config import DEV_MODE, MORE_LOGS, get_redis_config
+from services.config import DEV_MODE, MORE_LOGS, get_redis_config, set_redis_config
 
 
 logger = logging.getLogger(__name__)
 
 r = None # Глобальный клиент Redis (создаётся один раз на импорт)
+REDIS_MAX_CONNECTIONS = 8 # Максимальное количество соединений в пуле
+GIFTS_CACHE_TTL = 0.5 # Время жизни кеша подарков из Redis (в секундах)
+_gifts_cache = {"gifts": None, "hash": None, "ts": 0.0} # Кеш разобранного списка подарков (price, supply, gift)
 
 def get_redis():
     """
     Возвращает глобальный экземпляр клиента Redis.
-    Создаёт подключение при первом вызове.
+    Создаёт пул соединений при первом вызове, дальше соединения переиспользуются.
     :return: Экземпляр redis.Redis
     """
-    redis_host, redis_port = get_redis_config()
     global r
     if r is None:
+        redis_host, redis_port = get_redis_config()
         try:
-            r = redis.Redis(
+            pool = redis.ConnectionPool(
                 host=redis_host,
                 port=redis_port,
                 decode_responses=True,
                 socket_timeout=1,
-                socket_connect_timeout=1
+                socket_connect_timeout=1,
+                max_connections=REDIS_MAX_CONNECTIONS
             )
+            r = redis.Redis(connection_pool=pool)
         except Exception as e:
             logger.error(f"Ошибка подключения к Redis: {e}")
             r = None
     return r
 
+async def configure_redis(host: str, port: int) -> None:
+    """
+    Сохраняет новые настройки Redis и закрывает текущий клиент,
+    чтобы следующий вызов get_redis подключился уже с новыми параметрами.
+
+    :param host: Адрес Redis сервера
+    :param port: Порт Redis сервера
+    """
+    global r
+    set_redis_config(host, port)
+    client, r = r, None
+    _invalidate_gifts_cache()
+    if client is not None:
+        try:
+            # Пул создан явно, поэтому клиент не закрывает его сам — закрываем вместе с клиентом
+            await client.aclose(close_connection_pool=True)
+        except Exception as e:
+            logger.error(f"Ошибка закрытия клиента Redis: {e}")
+
+async def warmup_redis() -> bool:
+    """
+    Открывает первое соединение с Redis заранее (PING),
+    чтобы первый запрос подарков не тратил время на подключение.
+
+    :return: True, если Redis ответил
+    """
+    try:
+        return bool(await get_redis().ping())
+    except Exception as e:
+        logger.error(f"Redis недоступен при запуске: {e}")
+        return False
+
 async def is_redis_active():
     """
     Проверяет, справляется ли Redis с задачей обновления списка подарков.
@@ -71,8 +116,55 @@ async def is_redis_active():
             return gifts_redis, state_redis
     except Exception as e:
         logger.error(f"Ошибка проверки состояния Redis: {e}")
+    _invalidate_gifts_cache()
     return [], False
 
+def _invalidate_gifts_cache() -> None:
+    """
+    Сбрасывает кеш подарков из Redis.
+    """
+    _gifts_cache["gifts"] = None
+    _gifts_cache["hash"] = None
+    _gifts_cache["ts"] = 0.0
+
+def _index_market_gifts(gifts: list[dict]) -> list[tuple[int, int, dict]]:
+    """
+    Готовит подарки к многократной фильтрации: заранее извлекает цену и supply
+    и сортирует по цене по убыванию, чтобы фильтр не читал словари и не сортировал заново.
+
+    :param gifts: Список подарков из Redis.
+    :return: Список кортежей (price, supply, gift), отсортированный по цене по убыванию.
+    """
+    indexed = [(gift["price"], gift.get("supply") or 0, gift) for gift in gifts]
+    indexed.sort(key=itemgetter(0), reverse=True)
+    return indexed
+
+async def _get_market_gifts() -> list[tuple[int, int, dict]] | None:
+    """
+    Возвращает подготовленный список подарков из Redis (см. _index_market_gifts).
+    В течение GIFTS_CACHE_TTL секунд список берётся из кеша без запроса к Redis,
+    а если содержимое ключа не изменилось — повторный разбор JSON пропускается.
+
+    :return: Список кортежей (price, supply, gift) или None, если данных нет
+    """
+    now = time.monotonic()
+    if _gifts_cache["gifts"] is not None and now - _gifts_cache["ts"] < GIFTS_CACHE_TTL:
+        return _gifts_cache["gifts"]
+
+    # Таймаут обеспечивает socket_timeout клиента
+    data = await get_redis().get("market:gifts")
+    if not data:
+        _invalidate_gifts_cache()
+        return None
+
+    data_hash = hash(data)
+    if _gifts_cache["gifts"] is None or _gifts_cache["hash"] != data_hash:
+        gifts = orjson.loads(data) if orjson is not None else json.loads(data)
+        _gifts_cache["gifts"] = _index_market_gifts(gifts)
+        _gifts_cache["hash"] = data_hash
+    _gifts_cache["ts"] = now
+    return _gifts_cache["gifts"]
+
 def normalize_gift(gift: dict) -> dict:
     """
     Преобразует объект Gift (словарь) в словарь с основными характеристиками подарка.
@@ -112,43 +204,40 @@ async def get_redis_filtered_gifts(
     """
     try:
         # Получаем, нормализуем и фильтруем подарки из redis потока
-        r = get_redis()
-        data = await asyncio.wait_for(r.get("market:gifts"), timeout=1.0)
-        if not data:
+        gifts = await _get_market_gifts()
+        if gifts is None:
             return [], False # Возвращаем пустой список и False, если данных нет
-        gifts = json.loads(data)
         if MORE_LOGS: 
             logger.info(f"Получено {len(gifts)} подарков из Redis.")
 
-        filtered = []
-        for gift in gifts:
-            price_ok = min_price <= gift["price"] <= max_price
-            # Логика по unlimited
-            if unlimited:
-                supply_ok = True
-            else:
-                supply = gift.get("supply") or 0
-                supply_ok = min_supply <= supply <= max_supply
-            if price_ok and supply_ok:
-                filtered.append(gift)
-
-        normalized = [normalize_gift(gift) for gift in filtered]
-        
+        # Фильтрация и нормализация за один проход; порядок по цене уже задан индексом
+        normalized = [
+            normalize_gift(gift) for price, supply, gift in gifts
+            if min_price <= price <= max_price and (
+                unlimited or min_supply <= supply <= max_supply
+            )
+        ]
+
+        # Без тестовых подарков (обычный режим) — список уже готов
+        if not (add_test_gifts or DEV_MODE):
+            return normalized, True
+
         # Получаем и фильтруем тестовые подарки отдельно
-        test_gifts = []
-        if add_test_gifts or DEV_MODE:
-            test_gifts = generate_test_gifts(test_gifts_count)
-            test_gifts = [
-                gift for gift in test_gifts
-                if min_price <= gift["price"] <= max_price and (
-                    unlimited or min_supply <= gift["supply"] <= max_supply
-                )
-            ]
-
-        all_gifts = normalized + test_gifts
-        all_gifts.sort(key=lambda g: g["price"], reverse=True)
+        test_gifts = [
+            gift for gift in generate_test_gifts(test_gifts_count)
+            if min_price <= gift["price"] <= max_price and (
+                unlimited or min_supply <= gift["supply"] <= max_supply
+            )
+        ]
+        if not test_gifts:
+            return normalized, True
+
+        # Сливаем два уже отсортированных списка за O(N+M)
+        test_gifts.sort(key=itemgetter("price"), reverse=True)
+        all_gifts = list(heapq.merge(normalized, test_gifts, key=itemgetter("price"), reverse=True))
         return all_gifts, True  # Возвращаем True, чтобы показать, что данные получены из Redis
     except Exception as e:
+        _invalidate_gifts_cache()
         if MORE_LOGS:
             logger.error(f"Ошибка при получении данных из Redis: {e}")
         return [], False  # Возвращаем пустой список и False, если Redis недоступен
\ No newline at end of file
@@ -13,6 +13,7 @@
 
 # --- Стандартные библиотеки ---
 import logging
+from operator import itemgetter
 
 # --- Сторонние библиотеки ---
 from pyrogram import Client
@@ -113,5 +114,5 @@ async def get_userbot_filtered_gifts(
         ]
         filtered += test_filtered
 
-    filtered.sort(key=lambda g: g["price"], reverse=True)
+    filtered.sort(key=itemgetter("price"), reverse=True)
     return filtered
\ No newline at end of file
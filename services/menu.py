@@ -14,6 +14,10 @@
 - payment_keyboard: Генерирует клавиатуру для оплаты.
 """
 
+# --- Стандартные библиотеки ---
+import asyncio
+from functools import lru_cache
+
 # --- Сторонние библиотеки ---
 from aiogram import Bot
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
@@ -21,16 +25,20 @@ from aiogram.exceptions import TelegramBadRequest
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
 # --- Внутренние библиотеки ---
-from services.config import load_config, save_config, get_valid_config, format_config_summary
+from services.config import load_config, get_valid_config, format_config_summary, update_config_value, CONFIG_FLUSH_DELAY
+
+TELEGRAM_CONCURRENCY = 25 # Максимум одновременных запросов меню к Telegram
+_TG_SEM = asyncio.Semaphore(TELEGRAM_CONCURRENCY) # Ограничение одновременных запросов к Telegram
+_MENU_LOCKS: dict[int, asyncio.Lock] = {} # Блокировки обновления меню по чатам
+_MENU_SEQ: dict[int, int] = {} # Номер последнего запрошенного обновления меню по чатам
 
 async def update_last_menu_message_id(message_id: int) -> None:
     """
     Сохраняет id последнего сообщения с меню в конфиг.
+    Запись на диск отложенная: частые обновления меню сливаются в одну запись.
     :param message_id: ID сообщения меню
     """
-    config = await load_config()
-    config["LAST_MENU_MESSAGE_ID"] = message_id
-    await save_config(config)
+    await update_config_value("LAST_MENU_MESSAGE_ID", message_id, delay=CONFIG_FLUSH_DELAY)
 
 
 async def get_last_menu_message_id() -> int | None:
@@ -42,9 +50,9 @@ async def get_last_menu_message_id() -> int | None:
     return config.get("LAST_MENU_MESSAGE_ID")
 
 
-def config_action_keyboard(active: bool) -> InlineKeyboardMarkup:
+def _build_config_action_keyboard(active: bool) -> InlineKeyboardMarkup:
     """
-    Генерирует inline-клавиатуру для меню с действиями.
+    Собирает inline-клавиатуру для меню с действиями.
     :param active: Статус активности (True/False)
     :return: InlineKeyboardMarkup для меню
     """
@@ -72,17 +80,77 @@ def config_action_keyboard(active: bool) -> InlineKeyboardMarkup:
     ])
 
 
+# Клавиатура меню статична — собираем оба варианта один раз при импорте
+_KB_ACTIVE = _build_config_action_keyboard(True)
+_KB_INACTIVE = _build_config_action_keyboard(False)
+
+
+def config_action_keyboard(active: bool) -> InlineKeyboardMarkup:
+    """
+    Возвращает inline-клавиатуру для меню с действиями.
+    :param active: Статус активности (True/False)
+    :return: InlineKeyboardMarkup для меню
+    """
+    return _KB_ACTIVE if active else _KB_INACTIVE
+
+
 async def update_menu(bot: Bot, chat_id: int, user_id: int, message_id: int) -> None:
     """
-    Обновляет меню в чате: удаляет предыдущее и отправляет новое.
+    Обновляет меню в чате.
+    Обновления одного чата выполняются по очереди, а если пока обновление ждало очереди
+    пришло более новое — оно пропускается: новое всё равно покажет актуальное состояние.
+    :param bot: Экземпляр бота aiogram
+    :param chat_id: ID чата
+    :param user_id: ID пользователя
+    :param message_id: ID текущего сообщения меню
+    """
+    seq = _MENU_SEQ.get(chat_id, 0) + 1
+    _MENU_SEQ[chat_id] = seq
+    lock = _MENU_LOCKS.setdefault(chat_id, asyncio.Lock())
+    async with lock:
+        if _MENU_SEQ[chat_id] != seq:
+            return
+        await _update_menu(bot=bot, chat_id=chat_id, user_id=user_id, message_id=message_id)
+
+
+async def _update_menu(bot: Bot, chat_id: int, user_id: int, message_id: int) -> None:
+    """
+    Обновляет меню в чате.
+    Если текущее сообщение и есть последнее меню — редактирует его на месте одним запросом,
+    иначе удаляет предыдущее меню и отправляет новое.
     :param bot: Экземпляр бота aiogram
     :param chat_id: ID чата
     :param user_id: ID пользователя
     :param message_id: ID текущего сообщения меню
     """
     config = await get_valid_config(user_id)
+    text = format_config_summary(config, user_id)
+
+    if message_id and config.get("LAST_MENU_MESSAGE_ID") == message_id:
+        try:
+            async with _TG_SEM:
+                await bot.edit_message_text(
+                    chat_id=chat_id,
+                    message_id=message_id,
+                    text=text,
+                    reply_markup=config_action_keyboard(config.get("ACTIVE"))
+                )
+            return
+        except TelegramBadRequest as e:
+            error_text = str(e)
+            if "message is not modified" in error_text:
+                return
+            if "message to edit not found" in error_text:
+                # Меню уже удалено — просто отправляем новое
+                await send_menu(bot=bot, chat_id=chat_id, config=config, text=text)
+                return
+            # Прочие ошибки редактирования — удаляем старое меню и отправляем новое
+            await delete_menu(bot=bot, chat_id=chat_id)
+            await send_menu(bot=bot, chat_id=chat_id, config=config, text=text)
+            return
+
     await delete_menu(bot=bot, chat_id=chat_id, current_message_id=message_id)
-    await send_menu(bot=bot, chat_id=chat_id, config=config, text=format_config_summary(config, user_id))
+    await send_menu(bot=bot, chat_id=chat_id, config=config, text=text)
 
 
 async def delete_menu(bot: Bot, chat_id: int, current_message_id: int = None) -> None:
@@ -95,14 +163,16 @@ async def delete_menu(bot: Bot, chat_id: int, current_message_id: int = None) ->
     last_menu_message_id = await get_last_menu_message_id()
     if last_menu_message_id and last_menu_message_id != current_message_id:
         try:
-            await bot.delete_message(chat_id=chat_id, message_id=last_menu_message_id)
+            async with _TG_SEM:
+                await bot.delete_message(chat_id=chat_id, message_id=last_menu_message_id)
         except TelegramBadRequest as e:
             error_text = str(e)
             if "message can't be deleted for everyone" in error_text:
-                await bot.send_message(
-                    chat_id,
-                    "⚠️ Предыдущее меню устарело и не может быть удалено (прошло более 48 часов). Используйте актуальное меню.\n"
-                )
+                async with _TG_SEM:
+                    await bot.send_message(
+                        chat_id,
+                        "⚠️ Предыдущее меню устарело и не может быть удалено (прошло более 48 часов). Используйте актуальное меню.\n"
+                    )
             elif "message to delete not found" in error_text:
                 pass
             else:
@@ -118,15 +188,19 @@ async def send_menu(bot: Bot, chat_id: int, config: dict, text: str) -> int:
     :param text: Текст меню
     :return: ID отправленного сообщения
     """
-    sent = await bot.send_message(
-        chat_id=chat_id,
-        text=text,
-        reply_markup=config_action_keyboard(config.get("ACTIVE"))
-    )
-    await update_last_menu_message_id(sent.message_id)
+    async with _TG_SEM:
+        sent = await bot.send_message(
+            chat_id=chat_id,
+            text=text,
+            reply_markup=config_action_keyboard(config.get("ACTIVE"))
+        )
+    # Меняем только LAST_MENU_MESSAGE_ID в актуальном конфиге: за время запросов к Telegram
+    # воркер мог сохранить BOUGHT/SPENT, и запись снимка config затёрла бы эти счётчики
+    await update_config_value("LAST_MENU_MESSAGE_ID", sent.message_id, delay=CONFIG_FLUSH_DELAY)
     return sent.message_id
 
 
+@lru_cache(maxsize=128)
 def payment_keyboard(amount: int) -> InlineKeyboardMarkup:
     """
     Генерирует inline-клавиатуру с кнопкой оплаты для инвойса.
@@ -0,0 +1,262 @@
+"""
+Модуль хранения состояния профилей в Redis.
+
+Этот модуль содержит функции для:
+- Захвата и освобождения блокировки профиля воркером.
+- Атомарного учёта покупок (BOUGHT/SPENT) и статуса DONE профиля.
+- Получения и сброса состояния профилей.
+
+Блокировка позволяет запускать несколько экземпляров воркера с общим Redis:
+профиль обрабатывается только тем воркером, который захватил его блокировку.
+Счётчики BOUGHT/SPENT/DONE в Redis общие для всех экземпляров: воркер читает их
+под блокировкой и переносит в свой config.json перед покупками. При ошибках Redis
+профиль не обрабатывается (fail closed), чтобы не купить сверх COUNT/LIMIT.
+
+Основные функции:
+- acquire_profile_lock: Захватывает блокировку профиля (SET NX EX).
+- release_profile_lock: Освобождает блокировку, если она принадлежит воркеру.
+- sync_profile_state: Возвращает общие счётчики профиля (или заполняет их из конфига).
+- get_state_generation: Возвращает номер поколения состояния (меняется при сбросах).
+- record_purchase: Учитывает покупку в счётчиках профиля (HINCRBY).
+- set_profile_done: Отмечает профиль завершённым (HSET).
+- reset_profile_states: Сбрасывает состояние всех профилей пользователя.
+- reset_profile_state: Сбрасывает состояние одного профиля (после редактирования).
+- shift_profile_states: Сдвигает состояния профилей после удаления профиля.
+"""
+
+# --- Стандартные библиотеки ---
+import logging
+import os
+import socket
+
+# --- Внутренние модули ---
+from services.gifts_redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}" # Идентификатор текущего воркера
+PROFILE_LOCK_TTL = 30 # Время жизни блокировки профиля (в секундах)
+
+# Удаляет блокировку только если она принадлежит указанному воркеру
+_RELEASE_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+# Возвращает счётчики профиля; если их ещё нет — заполняет значениями из конфига воркера
+_SYNC_SCRIPT = """
+if redis.call("EXISTS", KEYS[1]) == 0 then
+    redis.call("HSET", KEYS[1], "BOUGHT", ARGV[1], "SPENT", ARGV[2], "DONE", ARGV[3])
+end
+return redis.call("HMGET", KEYS[1], "BOUGHT", "SPENT", "DONE")
+"""
+
+# Учитывает покупку и продлевает блокировку, только если она принадлежит воркеру.
+# Третий элемент ответа — владеет ли воркер блокировкой (1/0)
+_RECORD_SCRIPT = """
+local bought = redis.call("HINCRBY", KEYS[1], "BOUGHT", 1)
+local spent = redis.call("HINCRBY", KEYS[1], "SPENT", ARGV[1])
+local owned = 0
+if redis.call("GET", KEYS[2]) == ARGV[2] then
+    redis.call("EXPIRE", KEYS[2], ARGV[3])
+    owned = 1
+end
+return {bought, spent, owned}
+"""
+
+# Сдвигает состояния профилей на одну позицию вниз, начиная с удалённого (KEYS[1])
+_SHIFT_SCRIPT = """
+redis.call("DEL", KEYS[1])
+for i = 1, #KEYS - 1 do
+    if redis.call("EXISTS", KEYS[i + 1]) == 1 then
+        redis.call("RENAME", KEYS[i + 1], KEYS[i])
+    end
+end
+return 1
+"""
+
+
+def _lock_key(user_id: int, profile_index: int) -> str:
+    return f"profile:lock:{user_id}:{profile_index}"
+
+
+def _state_key(user_id: int, profile_index: int) -> str:
+    return f"profile:state:{user_id}:{profile_index}"
+
+
+def _generation_key(user_id: int) -> str:
+    return f"profile:generation:{user_id}"
+
+
+async def acquire_profile_lock(user_id: int, profile_index: int, ttl: int = PROFILE_LOCK_TTL) -> bool:
+    """
+    Захватывает блокировку профиля для текущего воркера.
+    Если Redis недоступен — блокировка не считается полученной и профиль пропускается.
+
+    :param user_id: ID пользователя
+    :param profile_index: Индекс профиля
+    :param ttl: Время жизни блокировки (в секундах)
+    :return: True, если профиль можно обрабатывать
+    """
+    try:
+        r = get_redis()
+        return bool(await r.set(_lock_key(user_id, profile_index), WORKER_ID, nx=True, ex=ttl))
+    except Exception as e:
+        logger.error(f"Ошибка захвата блокировки профиля {profile_index} в Redis: {e}")
+        return False
+
+
+async def release_profile_lock(user_id: int, profile_index: int) -> None:
+    """
+    Освобождает блокировку профиля, если она принадлежит текущему воркеру.
+
+    :param user_id: ID пользователя
+    :param profile_index: Индекс профиля
+    """
+    try:
+        r = get_redis()
+        await r.eval(_RELEASE_SCRIPT, 1, _lock_key(user_id, profile_index), WORKER_ID)
+    except Exception as e:
+        logger.error(f"Ошибка освобождения блокировки профиля {profile_index} в Redis: {e}")
+
+
+async def sync_profile_state(user_id: int, profile_index: int, profile: dict) -> dict | None:
+    """
+    Возвращает общие счётчики профиля из Redis.
+    Если в Redis их ещё нет, они заполняются значениями из профиля текущего воркера.
+    Вызывается под блокировкой профиля.
+
+    :param user_id: ID пользователя
+    :param profile_index: Индекс профиля
+    :param profile: Профиль из config.json текущего воркера
+    :return: Словарь с полями BOUGHT, SPENT, DONE или None при ошибке Redis
+    """
+    try:
+        r = get_redis()
+        bought, spent, done = await r.eval(
+            _SYNC_SCRIPT, 1, _state_key(user_id, profile_index),
+            profile["BOUGHT"], profile["SPENT"], int(profile["DONE"])
+        )
+    except Exception as e:
+        logger.error(f"Ошибка чтения состояния профиля {profile_index} из Redis: {e}")
+        return None
+    return {
+        "BOUGHT": int(bought or 0),
+        "SPENT": int(spent or 0),
+        "DONE": done == "1"
+    }
+
+
+async def record_purchase(user_id: int, profile_index: int, price: int) -> bool:
+    """
+    Атомарно учитывает покупку в счётчиках профиля за один запрос к Redis
+    и продлевает блокировку профиля, если она всё ещё принадлежит текущему воркеру.
+    Покупка учитывается в любом случае (она уже совершена), но если блокировка
+    истекла или перехвачена, воркер должен прекратить покупки по профилю.
+
+    :param user_id: ID пользователя
+    :param profile_index: Индекс профиля
+    :param price: Стоимость купленного подарка
+    :return: True, если покупка учтена и блокировка по-прежнему у текущего воркера
+    """
+    try:
+        r = get_redis()
+        _, _, owned = await r.eval(
+            _RECORD_SCRIPT, 2,
+            _state_key(user_id, profile_index), _lock_key(user_id, profile_index),
+            price, WORKER_ID, PROFILE_LOCK_TTL
+        )
+    except Exception as e:
+        logger.error(f"Ошибка записи покупки профиля {profile_index} в Redis: {e}")
+        return False
+    if not owned:
+        logger.warning(f"Блокировка профиля {profile_index} потеряна — покупки по профилю остановлены.")
+        return False
+    return True
+
+
+async def get_state_generation(user_id: int) -> int | None:
+    """
+    Возвращает номер поколения состояния профилей пользователя.
+    Номер увеличивается при каждом сбросе или сдвиге состояний: по его изменению
+    воркер понимает, что локально завершённые профили нужно сверить с Redis.
+
+    :param user_id: ID пользователя
+    :return: Номер поколения или None при ошибке Redis
+    """
+    try:
+        r = get_redis()
+        return int(await r.get(_generation_key(user_id)) or 0)
+    except Exception as e:
+        logger.error(f"Ошибка чтения поколения состояния профилей из Redis: {e}")
+        return None
+
+
+async def set_profile_done(user_id: int, profile_index: int, done: bool = True) -> None:
+    """
+    Устанавливает статус DONE профиля.
+
+    :param user_id: ID пользователя
+    :param profile_index: Индекс профиля
+    :param done: Новое значение статуса
+    """
+    try:
+        r = get_redis()
+        await r.hset(_state_key(user_id, profile_index), "DONE", int(done))
+    except Exception as e:
+        logger.error(f"Ошибка записи статуса профиля {profile_index} в Redis: {e}")
+
+
+async def reset_profile_states(user_id: int, profiles_count: int, start: int = 0) -> None:
+    """
+    Сбрасывает состояние профилей пользователя в Redis.
+    Счётчики записываются нулями, а не удаляются: иначе другой экземпляр
+    заполнил бы их заново старыми значениями из своего config.json.
+
+    :param user_id: ID пользователя
+    :param profiles_count: Количество профилей
+    :param start: Индекс первого сбрасываемого профиля
+    """
+    try:
+        r = get_redis()
+        async with r.pipeline(transaction=True) as pipe:
+            for idx in range(start, profiles_count):
+                pipe.hset(_state_key(user_id, idx), mapping={"BOUGHT": 0, "SPENT": 0, "DONE": 0})
+            # Сообщаем воркерам, что завершённые профили нужно сверить заново
+            pipe.incr(_generation_key(user_id))
+            await pipe.execute()
+    except Exception as e:
+        logger.error(f"Ошибка сброса состояния профилей в Redis: {e}")
+
+
+async def reset_profile_state(user_id: int, profile_index: int) -> None:
+    """
+    Сбрасывает состояние одного профиля в Redis (например, после его редактирования).
+
+    :param user_id: ID пользователя
+    :param profile_index: Индекс профиля
+    """
+    await reset_profile_states(user_id, profile_index + 1, start=profile_index)
+
+
+async def shift_profile_states(user_id: int, removed_index: int, profiles_count: int) -> None:
+    """
+    Удаляет состояние удалённого профиля и сдвигает состояния следующих профилей,
+    чтобы индексы в Redis совпадали с индексами профилей в конфиге.
+
+    :param user_id: ID пользователя
+    :param removed_index: Индекс удалённого профиля
+    :param profiles_count: Количество профилей до удаления
+    """
+    try:
+        r = get_redis()
+        keys = [_state_key(user_id, idx) for idx in range(removed_index, profiles_count)]
+        if keys:
+            async with r.pipeline(transaction=True) as pipe:
+                pipe.eval(_SHIFT_SCRIPT, len(keys), *keys)
+                pipe.incr(_generation_key(user_id))
+                await pipe.execute()
+    except Exception as e:
+        logger.error(f"Ошибка сдвига состояния профилей в Redis: {e}")
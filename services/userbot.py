@@ -16,14 +16,19 @@
 - finish_userbot_signin: Завершает авторизацию userbot-а.
 - delete_userbot_session: Удаляет userbot-сессию.
 - get_userbot_stars_balance: Получает баланс звёзд через userbot.
+- invalidate_userbot_stars_cache: Сбрасывает кеш баланса звёзд userbot-а.
 """
 
 # --- Стандартные библиотеки ---
+import asyncio
+import contextlib
 import logging
 import os
 import builtins
 import platform
 import random
+import time
+from pathlib import Path
 
 # --- Сторонние библиотеки ---
 from aiogram.types import CallbackQuery, Message
@@ -51,8 +56,48 @@ sessions_dir = os.path.abspath("sessions") # Папка для хранения
 os.makedirs(sessions_dir, exist_ok=True)
 
 _clients = {}  # Временное хранилище Client по user_id
+_clients_lock = asyncio.Lock() # Блокировка изменений _clients
+_primary_user_id: int | None = None # user_id последнего авторизованного userbot-а
+STARS_CACHE_TTL = 3.0 # Время жизни кеша баланса звёзд userbot-а (в секундах)
+_stars_cache: dict[int, tuple[float, int]] = {} # user_id -> (время запроса, баланс)
 RESTART_REQUIRED: dict[int, bool] = {} # Флаг необходимости перезапуска userbot-сессии
 
+# Шаблон пустой секции USERBOT (все значения неизменяемые — достаточно поверхностной копии)
+_EMPTY_USERBOT_CONFIG = {
+    "API_ID": None,
+    "API_HASH": None,
+    "PHONE": None,
+    "USER_ID": None,
+    "USERNAME": None,
+    "ENABLED": False
+}
+
+
+_ORIGINAL_INPUT = builtins.input # Исходный input, восстанавливается после последнего _no_input
+_no_input_depth = 0 # Количество активных блоков _no_input (они могут пересекаться между корутинами)
+
+
+def _raise_no_input(*_):
+    raise RuntimeError("Интерактивный ввод отключён")
+
+
+@contextlib.contextmanager
+def _no_input():
+    """
+    Временно запрещает интерактивный ввод (Pyrogram запрашивает данные через input()).
+    Блоки из разных корутин могут пересекаться на await, поэтому ведётся счётчик вложенности:
+    исходный builtins.input возвращается, только когда завершился последний активный блок.
+    """
+    global _no_input_depth
+    _no_input_depth += 1
+    builtins.input = _raise_no_input
+    try:
+        yield
+    finally:
+        _no_input_depth -= 1
+        if _no_input_depth == 0:
+            builtins.input = _ORIGINAL_INPUT
+
 
 def is_userbot_active(user_id: int) -> bool:
     """
@@ -80,9 +125,6 @@ async def try_start_userbot_from_config(user_id: int, bot_id: int) -> bool:
     :return: True если успешно, иначе False
     """
     try:
-        # Запрет интерактивного ввода
-        builtins.input = lambda _: (_ for _ in ()).throw(RuntimeError())
-
         os.makedirs(sessions_dir, exist_ok=True)
 
         config = await get_valid_config(user_id)
@@ -95,21 +137,7 @@ async def try_start_userbot_from_config(user_id: int, bot_id: int) -> bool:
         if not all(userbot_data.get(k) for k in required_fields):
             logger.warning("Oтсутствуют обязательные данные в конфиге.")
 
-            if os.path.exists(session_path):
-                try:
-                    os.remove(session_path)
-                    logger.info(".session файл удалён из-за пустого конфига.")
-                except Exception as e:
-                    logger.error(f"Не удалось удалить .session файл: {e}")
-
-            journal_path = session_path + "-journal"
-            if os.path.exists(journal_path):
-                try:
-                    os.remove(journal_path)
-                    logger.info("Журнал сессии удалён.")
-                except Exception as e:
-                    logger.error(f"Не удалось удалить журнал сессии: {e}")
-
+            _wipe_session_files(session_path)
             await _clear_userbot_config(user_id)
             return False
 
@@ -124,15 +152,13 @@ async def try_start_userbot_from_config(user_id: int, bot_id: int) -> bool:
                 logger.error("Сессионный файл подозрительно мал — возможно, повреждён.")
 
             try:
-                await app.start()
+                with _no_input():
+                    await app.start()
                 me = await app.get_me()
                 logger.info(f"Авторизован как {me.first_name} ({me.id})")
 
                 # Добавляем клиент в _clients
-                _clients[user_id] = {
-                    "client": app,
-                    "started": True,
-                }
+                await _register_started_client(user_id, app)
 
                 return True
 
@@ -143,19 +169,7 @@ async def try_start_userbot_from_config(user_id: int, bot_id: int) -> bool:
                 except Exception as stop_err:
                     logger.error(f"Не удалось остановить клиент: {stop_err}")
 
-                try:
-                    os.remove(session_path)
-                    logger.info("Удалён .session файл.")
-                except Exception as rm_err:
-                    logger.error(f"Не удалось удалить сессию: {rm_err}")
-
-                journal = session_path + "-journal"
-                if os.path.exists(journal):
-                    try:
-                        os.remove(journal)
-                        logger.info("Журнал сессии удалён.")
-                    except Exception as j_err:
-                        logger.error(f"Не удалось удалить журнал сессии: {j_err}")
+                _wipe_session_files(session_path)
 
         else:
             logger.info("Файл сессии не найден. Авторизация не выполняется.")
@@ -170,20 +184,44 @@ async def try_start_userbot_from_config(user_id: int, bot_id: int) -> bool:
         return False
 
 
+async def _register_started_client(user_id: int, app: Client) -> None:
+    """
+    Сохраняет авторизованный клиент в _clients и делает его основным userbot-ом.
+    :param user_id: ID пользователя
+    :param app: Объект Pyrogram Client
+    """
+    global _primary_user_id
+    async with _clients_lock:
+        _clients[user_id] = {
+            "client": app,
+            "started": True,
+        }
+        _primary_user_id = user_id
+
+
+def _wipe_session_files(session_path: str) -> None:
+    """
+    Удаляет .session файл и его журнал, если они есть.
+    Для каждого файла выполняется только unlink, без предварительной проверки существования.
+    :param session_path: Путь к .session файлу
+    """
+    for path, label in ((session_path, ".session файл"), (session_path + "-journal", "журнал сессии")):
+        try:
+            Path(path).unlink()
+            logger.info(f"Удалён {label}.")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Не удалось удалить {label}: {e}")
+
+
 async def _clear_userbot_config(user_id: int) -> None:
     """
     Сбрасывает поля USERBOT в конфиге.
     :param user_id: ID пользователя
     """
     config = await get_valid_config(user_id)
-    config["USERBOT"] = {
-        "API_ID": None,
-        "API_HASH": None,
-        "PHONE": None,
-        "USER_ID": None,
-        "USERNAME": None,
-        "ENABLED": False
-    }
+    config["USERBOT"] = dict(_EMPTY_USERBOT_CONFIG)
     await save_config(config)
     logger.info("Данные в конфиге очищены.")
 
@@ -218,7 +256,7 @@ async def create_userbot_client(
         config["USERBOT"].update({"CONFIG_ID": config_id})
         await save_config(config)
 
-    proxy_settings = await get_userbot_proxy(user_id, bot_id)
+    proxy_settings = get_userbot_proxy(user_id, bot_id)
     return Client(
         name=session_name,
         api_id=api_id,
@@ -243,9 +281,6 @@ async def start_userbot(message: Message, state) -> bool:
     :param state: FSMContext или аналог
     :return: True если успешно, иначе False
     """
-    # Запрет интерактивного ввода
-    builtins.input = lambda _: (_ for _ in ()).throw(RuntimeError())
-
     data = await state.get_data()
     user_id = message.from_user.id
     bot_id = message.bot.id
@@ -257,17 +292,32 @@ async def start_userbot(message: Message, state) -> bool:
     api_hash = data["api_hash"]
     phone_number = data["phone"]
 
+    # Закрываем клиент предыдущей попытки авторизации, чтобы не оставлять открытое соединение
+    async with _clients_lock:
+        previous = _clients.pop(user_id, None)
+    if previous:
+        await _close_client(previous)
+
     app: Client = await create_userbot_client(user_id, bot_id, session_name, api_id, api_hash, phone_number, sessions_dir)
 
-    await app.connect()
+    with _no_input():
+        await app.connect()
 
+    # Соединение остаётся открытым на все шаги авторизации и закрывается только при ошибке
+    code_sent = False
     try:
         sent = await app.send_code(phone_number)
-        _clients[user_id] = {
-            "client": app,
-            "phone_code_hash": sent.phone_code_hash,
-            "phone": phone_number
-        }
+        async with _clients_lock:
+            previous = _clients.get(user_id)
+            _clients[user_id] = {
+                "client": app,
+                "phone_code_hash": sent.phone_code_hash,
+                "phone": phone_number
+            }
+        # Повторный запуск мог успеть создать свой клиент — закрываем его
+        if previous and previous["client"] is not app:
+            await _close_client(previous)
+        code_sent = True
         return True
     except ApiIdInvalid:
         logger.error("Неверный api_id и api_hash. Проверьте данные.")
@@ -298,9 +348,36 @@ async def start_userbot(message: Message, state) -> bool:
         await message.answer(f"🚫 Неизвестная ошибка: {e}")
         return False
     finally:
-        if not app.is_connected:
+        if not code_sent and app.is_connected:
             await app.disconnect()
-            return False
+
+
+async def _close_client(client_info: dict) -> None:
+    """
+    Закрывает клиент из _clients: запущенный — останавливает, подключённый — отключает.
+    :param client_info: Запись из _clients
+    """
+    app: Client = client_info["client"]
+    try:
+        if client_info.get("started"):
+            await app.stop()
+        elif app.is_connected:
+            await app.disconnect()
+    except Exception as e:
+        logger.error(f"Не удалось закрыть предыдущий клиент: {e}")
+
+
+async def _ensure_connected(app: Client) -> Client:
+    """
+    Переиспользует соединение клиента между шагами авторизации.
+    Переподключается, только если соединение было потеряно (например, по таймауту простоя).
+    :param app: Объект Pyrogram Client
+    :return: Подключённый клиент
+    """
+    if not app.is_connected:
+        logger.info("Соединение userbot-а потеряно, переподключаемся.")
+        await app.connect()
+    return app
 
 
 async def continue_userbot_signin(call: CallbackQuery, state: FSMContext) -> tuple[bool, bool, bool]:
@@ -313,8 +390,6 @@ async def continue_userbot_signin(call: CallbackQuery, state: FSMContext) -> tup
     data = await state.get_data()
     message: Message = call.message
     user_id = call.from_user.id
-    bot_user = await message.bot.get_me()
-    bot_username = bot_user.username
     code = data["code"]
     attempts = data.get("code_attempts", 0)
     client_info = _clients.get(user_id)
@@ -335,6 +410,7 @@ async def continue_userbot_signin(call: CallbackQuery, state: FSMContext) -> tup
         return False, False, False
 
     try:
+        await _ensure_connected(app)
         await app.sign_in(
             phone_number=phone,
             phone_code_hash=phone_code_hash,
@@ -352,19 +428,18 @@ async def continue_userbot_signin(call: CallbackQuery, state: FSMContext) -> tup
         logger.info(f"Userbot успешно авторизован: {me.first_name} ({me.id})")
 
         # Добавляем клиент в _clients
-        _clients[user_id] = {
-            "client": app,
-            "started": True,
-        }
+        await _register_started_client(user_id, app)
 
         # Сохраняем данные
         config = await get_valid_config(user_id)
-        config["USERBOT"]["API_ID"] = api_id
-        config["USERBOT"]["API_HASH"] = api_hash
-        config["USERBOT"]["PHONE"] = phone
-        config["USERBOT"]["USER_ID"] = me.id
-        config["USERBOT"]["USERNAME"] = me.username
-        config["USERBOT"]["ENABLED"] = True
+        config["USERBOT"].update({
+            "API_ID": api_id,
+            "API_HASH": api_hash,
+            "PHONE": phone,
+            "USER_ID": me.id,
+            "USERNAME": me.username,
+            "ENABLED": True
+        })
         await save_config(config)
         
         return True, False, False  # Успешно, пароль не требуется, не retry
@@ -401,8 +476,6 @@ async def finish_userbot_signin(message: Message, state) -> tuple[bool, bool]:
     """
     data = await state.get_data()
     user_id = message.from_user.id
-    bot_user = await message.bot.get_me()
-    bot_username = bot_user.username
     client_info = _clients.get(user_id)
 
     if not client_info:
@@ -423,6 +496,7 @@ async def finish_userbot_signin(message: Message, state) -> tuple[bool, bool]:
         return False, False
     
     try:
+        await _ensure_connected(app)
         await app.check_password(password)
 
         # Проверка авторизации через get_me()
@@ -436,19 +510,18 @@ async def finish_userbot_signin(message: Message, state) -> tuple[bool, bool]:
         logger.info(f"Userbot успешно авторизован: {me.first_name} ({me.id})")
 
         # Добавляем клиент в _clients
-        _clients[user_id] = {
-            "client": app,
-            "started": True,
-        }
+        await _register_started_client(user_id, app)
 
         # Сохраняем данные
         config = await get_valid_config(user_id)
-        config["USERBOT"]["API_ID"] = api_id
-        config["USERBOT"]["API_HASH"] = api_hash
-        config["USERBOT"]["PHONE"] = phone
-        config["USERBOT"]["USER_ID"] = me.id
-        config["USERBOT"]["USERNAME"] = me.username
-        config["USERBOT"]["ENABLED"] = True
+        config["USERBOT"].update({
+            "API_ID": api_id,
+            "API_HASH": api_hash,
+            "PHONE": phone,
+            "USER_ID": me.id,
+            "USERNAME": me.username,
+            "ENABLED": True
+        })
         await save_config(config)
         return True, False
     except PasswordHashInvalid:
@@ -519,7 +592,6 @@ async def delete_userbot_session(call: CallbackQuery, user_id: int) -> bool:
     """
     session_name = f"userbot_{user_id}"
     session_path = os.path.join(sessions_dir, f"{session_name}.session")
-    journal_path = session_path + "-journal"
 
     # Останавливаем, если клиент активен
     client_info = _clients.get(user_id)
@@ -530,28 +602,19 @@ async def delete_userbot_session(call: CallbackQuery, user_id: int) -> bool:
         except Exception as e:
             logger.error(f"Ошибка при остановке клиента: {e}")
 
-    # Удаляем session файл
-    if os.path.exists(session_path):
-        try:
-            os.remove(session_path)
-            logger.info(".session файл удалён.")
-        except Exception as e:
-            logger.error(f"Не удалось удалить .session файл: {e}")
-
-    # Удаляем journal файл, если есть
-    if os.path.exists(journal_path):
-        try:
-            os.remove(journal_path)
-            logger.info("Журнал удалён.")
-        except Exception as e:
-            logger.error(f"Не удалось удалить журнал: {e}")
-
-    # Очищаем конфиг
-    await _clear_userbot_config(user_id)
+    # Удаляем session и journal файлы и очищаем конфиг параллельно — операции независимы
+    await asyncio.gather(
+        asyncio.to_thread(_wipe_session_files, session_path),
+        _clear_userbot_config(user_id)
+    )
 
     # Удаляем из памяти
-    if user_id in _clients:
-        del _clients[user_id]
+    global _primary_user_id
+    async with _clients_lock:
+        _clients.pop(user_id, None)
+        if _primary_user_id == user_id:
+            _primary_user_id = None
+    invalidate_userbot_stars_cache(user_id)
 
     # Показываем уведомление только на Windows или macOS
     if platform.system() in ("Windows", "Darwin"):
@@ -563,12 +626,35 @@ async def delete_userbot_session(call: CallbackQuery, user_id: int) -> bool:
     return True
 
 
-async def get_userbot_stars_balance() -> int:
+def invalidate_userbot_stars_cache(user_id: int | None = None) -> None:
+    """
+    Сбрасывает кеш баланса звёзд userbot-а.
+    :param user_id: ID пользователя (если не указан — сбрасывается весь кеш)
+    """
+    if user_id is None:
+        _stars_cache.clear()
+    else:
+        _stars_cache.pop(user_id, None)
+
+
+async def get_userbot_stars_balance(user_id: int | None = None, force: bool = False) -> int:
     """
     Получает баланс звёзд через авторизованного юзербота.
+    Повторные вызовы в течение STARS_CACHE_TTL секунд возвращают закешированное значение.
+    :param user_id: ID пользователя (по умолчанию — основной авторизованный userbot)
+    :param force: Игнорировать кеш и запросить баланс заново
     :return: Баланс звёзд (int)
     """
-    user_id = next(iter(_clients), None)
+    user_id = user_id or _primary_user_id
+    if user_id is None:
+        logger.error("Нет авторизованного userbot-а для получения баланса.")
+        return 0
+
+    now = time.monotonic()
+    cached = _stars_cache.get(user_id)
+    if not force and cached is not None and now - cached[0] < STARS_CACHE_TTL:
+        return cached[1]
+
     client_info = _clients.get(user_id)
     if not client_info or not client_info.get("client"):
         logger.error("Userbot не активен или не авторизован.")
@@ -578,6 +664,7 @@ async def get_userbot_stars_balance() -> int:
 
     try:
         stars = await app.get_stars_balance()
+        _stars_cache[user_id] = (now, stars)
         return stars
     except Exception as e:
         logger.error(f"Ошибка при получении баланса юзербота: {e}")
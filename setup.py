@@ -0,0 +1,24 @@
+"""
+Необязательная сборка нативных модулей через mypyc.
+
+Компилирует services/config.py (валидация конфига и форматирование меню)
+в C-расширение. Исходный .py остаётся на месте: если расширение не собрано,
+Python использует обычный модуль. Если mypy не установлен, сборка
+пропускается и установка остаётся чисто Python-овой.
+
+Сборка:
+    pip install mypy
+    python setup.py build_ext --inplace
+"""
+
+from setuptools import setup
+
+try:
+    from mypyc.build import mypycify
+except ImportError:  # mypyc необязателен — без него расширения не собираются
+    mypycify = None
+
+setup(
+    name="telegram-gifts-bot-native",
+    ext_modules=mypycify(["services/config.py"]) if mypycify is not None else [],
+)
@@ -6,11 +6,13 @@
 
 Основные функции:
 - get_env_variable: Получает значение переменной окружения с возможностью указания значения по умолчанию.
+- invalidate_env_cache: Сбрасывает снимок переменных окружения.
 """
 
 # --- Стандартные библиотеки ---
 import os
 import logging
+from functools import lru_cache
 
 # --- Сторонние библиотеки ---
 from dotenv import load_dotenv
@@ -33,20 +35,46 @@ logger = logging.getLogger(__name__)
 # PROXY_PASSWORD: str      # Пароль для авторизации в прокси
 # CONFIG_DATA: str         # JSON-строка с конфигурацией
 
-# Проверяем наличие файла .env и загружаем переменные, если файл существует
-if os.path.exists(".env"):
-    load_dotenv(override=False)
-    logger.info("Загружены переменные окружения из .env")
-else:
-    logger.warning("Файл .env не найден, используем os.environ.get")
+@lru_cache(maxsize=1)
+def _ensure_dotenv_loaded() -> None:
+    """
+    Загружает переменные из .env один раз за процесс (повторные вызовы ничего не делают).
+    Если файл .env отсутствует, используются системные переменные окружения.
+    """
+    if os.path.exists(".env"):
+        load_dotenv(override=False)
+        logger.info("Загружены переменные окружения из .env")
+    else:
+        logger.warning("Файл .env не найден, используем os.environ.get")
+
+
+_ensure_dotenv_loaded()
+
+
+@lru_cache(maxsize=1)
+def _env_snapshot() -> dict[str, str]:
+    """
+    Снимок os.environ (после загрузки .env): все чтения переменных идут из одного словаря.
+    """
+    _ensure_dotenv_loaded()
+    return dict(os.environ)
+
 
 def get_env_variable(key: str, default=None):
     """
     Получает значение переменной окружения.
     Если переменная не найдена, возвращает значение по умолчанию.
+    Значения читаются из снимка окружения — после изменения os.environ вызовите invalidate_env_cache().
 
     :param key: Название переменной окружения
     :param default: Значение по умолчанию, если переменная не найдена
     :return: Значение переменной окружения или default
     """
-    return os.getenv(key) or os.environ.get(key, default)
\ No newline at end of file
+    return _env_snapshot().get(key, default)
+
+
+def invalidate_env_cache() -> None:
+    """
+    Сбрасывает снимок переменных окружения (например, при перезагрузке настроек или в тестах, изменяющих os.environ).
+    """
+    _env_snapshot.cache_clear()
@@ -1,7 +1,7 @@
 """Утилита для кеширования последних строк логов в памяти.
 
 Модуль предоставляет:
-- LogCacheHandler: logging.Handler, сохраняющий N последних отформатированных строк в памяти (deque).
+- LogCacheHandler: logging.Handler, сохраняющий N последних записей логов в памяти (кольцевой буфер, форматирование при чтении).
 - LOG_CACHE_HANDLER: синглтон для быстрой регистрации в корневом логгере.
 - get_cached_lines / get_cached_text: функции для получения кеша логов.
 
@@ -9,55 +9,105 @@
 """
 
 import logging
-import threading
-from collections import deque
-from typing import List
+from typing import List, Optional, Tuple
+
+from utils.logging import LOG_FORMAT, LOG_DATEFMT, CachedTimeFormatter
 
 
 class LogCacheHandler(logging.Handler):
-    """Handler логирования, который хранит последние N отформатированных строк в памяти.
+    """Handler логирования, который хранит последние N строк логов в памяти.
+
+    Строки хранятся в заранее выделенном списке фиксированной длины с индексом записи,
+    поэтому добавление строки не выделяет память.
+
+    emit сразу вычисляет текст сообщения (и трейсбек, если он есть) и хранит небольшой
+    неизменяемый кортеж (created, levelname, name, message), а не сам LogRecord: так буфер
+    не удерживает exc_info с кадрами стека и изменяемые args. Форматирование по шаблону
+    (время, уровень) отложенное — выполняется при первом чтении кеша и не повторяется.
 
-    Потоко-безопасен: использует блокировку для доступа к внутреннему deque.
+    Потоко-безопасен без собственной блокировки: emit уже сериализован блокировкой
+    logging.Handler.handle, а чтение снимает копию буфера под той же блокировкой.
     """
 
     def __init__(self, capacity: int = 50, level: int = logging.INFO):
         super().__init__(level)
-        self._lock = threading.Lock()
-        self._lines = deque(maxlen=capacity)
+        self._capacity = capacity
+        self._buf: List[Optional[Tuple[float, str, str, str]]] = [None] * capacity
+        self._formatted: List[Optional[str]] = [None] * capacity # Уже отформатированные строки
+        self._count = 0 # Сколько строк записано всего (индекс записи = _count % capacity)
+        # Кеш склеенного текста: (версия, разделитель, текст)
+        self._joined = (-1, "\n", "")
 
     def emit(self, record: logging.LogRecord) -> None:
-        """Добавить отформатированную запись в кеш.
+        """Добавить запись в кеш: текст сообщения фиксируется сразу, шаблон применяется при чтении."""
+        try:
+            message = record.getMessage()
+        except Exception:
+            message = str(record.msg)
+        if record.exc_info:
+            formatter = self.formatter or logging.Formatter()
+            message = f"{message}\n{formatter.formatException(record.exc_info)}"
+        elif record.exc_text:
+            message = f"{message}\n{record.exc_text}"
+        if record.stack_info:
+            message = f"{message}\n{record.stack_info}"
+        idx = self._count % self._capacity
+        self._buf[idx] = (record.created, record.levelname, record.name, message)
+        self._formatted[idx] = None
+        self._count += 1
+
+    def _format_slot(self, idx: int) -> str:
+        """Вернуть строку для ячейки буфера, отформатировав запись при первом обращении.
 
         В случае ошибки форматирования используется упрощённое представление.
         """
-        try:
-            msg = self.format(record)
-        except Exception:
-            msg = f"{record.levelname}: {record.getMessage()}"
-        with self._lock:
-            self._lines.append(msg)
+        msg = self._formatted[idx]
+        if msg is None:
+            created, levelname, name, message = self._buf[idx]
+            try:
+                msg = self.format(logging.makeLogRecord(
+                    {"created": created, "levelname": levelname, "name": name, "msg": message}
+                ))
+            except Exception:
+                msg = f"{levelname}: {message}"
+            self._formatted[idx] = msg
+        return msg
 
     def get_lines(self) -> List[str]:
         """Вернуть список кешированных строк (от старых к новым)."""
-        with self._lock:
-            return list(self._lines)
+        self.acquire()
+        try:
+            count = self._count
+            if count < self._capacity:
+                order = range(count)
+            else:
+                start = count % self._capacity
+                order = [*range(start, self._capacity), *range(start)]
+            return [self._format_slot(idx) for idx in order]
+        finally:
+            self.release()
 
     def get_text(self, sep: str = "\n") -> str:
-        """Вернуть кеш как единый текст, строки разделяются `sep`."""
-        return sep.join(self.get_lines())
+        """Вернуть кеш как единый текст, строки разделяются `sep`.
+
+        Текст склеивается заново, только если с прошлого вызова появились новые строки
+        или изменился `sep`.
+        """
+        version = self._count
+        joined_version, joined_sep, joined_text = self._joined
+        if joined_version == version and joined_sep == sep:
+            return joined_text
+        # Версия читается до снимка: строки, добавленные во время склейки, пересоберутся в следующий раз
+        text = sep.join(self.get_lines())
+        self._joined = (version, sep, text)
+        return text
 
 
 # Синглтон-объект: модульные импорты могут регистрировать этот handler в корневом логгере
 LOG_CACHE_HANDLER = LogCacheHandler(capacity=50, level=logging.DEBUG)
 
 # По умолчанию задаём форматтер, соответствующий формату в utils.logging.setup_logging
-LOG_CACHE_HANDLER.setFormatter(
-    logging.Formatter(
-        "[{asctime}] [{levelname}] {name}: {message}",
-        style="{",
-        datefmt="%d.%m.%Y %H:%M:%S",
-    )
-)
+LOG_CACHE_HANDLER.setFormatter(CachedTimeFormatter(LOG_FORMAT, datefmt=LOG_DATEFMT))
 
 def get_cached_lines() -> List[str]:
     """Вернуть кешированные строки как список (от старых к новым)."""
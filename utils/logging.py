@@ -7,11 +7,37 @@
 
 Основные функции:
 - setup_logging: Настраивает стандартное логирование.
+- CachedTimeFormatter: Форматтер, форматирующий время записи не чаще раза в секунду.
 """
 
 # --- Стандартные библиотеки ---
 import logging
 
+LOG_FORMAT = "[%(asctime)s] [%(levelname)s] %(name)s: %(message)s" # Формат строки лога (%-стиль)
+LOG_DATEFMT = "%d.%m.%Y %H:%M:%S" # Формат даты в логах
+
+
+class CachedTimeFormatter(logging.Formatter):
+    """
+    Форматтер логов, который вызывает time.strftime не чаще одного раза в секунду:
+    записи в пределах одной секунды получают уже отформатированную строку времени.
+    Подходит только для datefmt без долей секунды (как LOG_DATEFMT).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._time_cache = (-1, "") # (секунда, отформатированное время)
+
+    def formatTime(self, record: logging.LogRecord, datefmt: str | None = None) -> str:
+        second = int(record.created)
+        cached_second, cached_text = self._time_cache
+        if cached_second == second:
+            return cached_text
+        text = super().formatTime(record, datefmt)
+        self._time_cache = (second, text)
+        return text
+
+
 def setup_logging(level: int = logging.INFO) -> None:
     """
     Инициализация стандартного логирования для проекта.
@@ -19,9 +45,11 @@ def setup_logging(level: int = logging.INFO) -> None:
     :param level: Уровень логирования (по умолчанию logging.INFO)
     :return: None
     """
-    logging.basicConfig(
-        level=level,
-        format="[{asctime}] [{levelname}] {name}: {message}",
-        style="{",
-        datefmt="%d.%m.%Y %H:%M:%S"
-    )
+    # Не заполняем в LogRecord неиспользуемые в формате поля (поток, процесс)
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(CachedTimeFormatter(LOG_FORMAT, datefmt=LOG_DATEFMT))
+    logging.basicConfig(level=level, handlers=[handler])
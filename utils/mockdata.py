@@ -10,6 +10,9 @@
 
 # --- Стандартные библиотеки ---
 import random
+import sys
+
+TEST_GIFT_EMOJI = sys.intern("🎁") # Общий объект эмодзи для всех тестовых подарков
 
 def generate_test_gifts(count: int = 1) -> list[dict]:
     """
@@ -18,16 +21,16 @@ def generate_test_gifts(count: int = 1) -> list[dict]:
     :param count: Количество подарков
     :return: Список словарей с параметрами подарков
     """
-    gifts = []
-    for i in range(count):
-        gift = {
+    # Цена на шаг выше выпадает с вероятностью 1/10 — сэмплируем сразу для всех подарков
+    price_steps = random.choices((0, 1), weights=(9, 1), k=count)
+    return [
+        {
             "id": f"0000{i}",
-            "price": 5000 + 1000 * random.choice([i, i, i, i, i, i, i, i, i, i + 1]),
+            "price": 5000 + 1000 * (i + step),
             "supply": 9000 + 1000 * i,
             "left": 4000 + 1000 * i,
             "sticker_file_id": f"FAKE_FILE_ID_{i}",
-            "emoji": "🎁"
+            "emoji": TEST_GIFT_EMOJI
         }
-        gifts.append(gift)
-
-    return gifts
\ No newline at end of file
+        for i, step in enumerate(price_steps)
+    ]
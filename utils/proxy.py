@@ -10,51 +10,128 @@
 - get_proxy_data: Возвращает данные для прокси-соединения.
 - get_aiohttp_session: Создаёт aiohttp-сессию с прокси.
 - get_userbot_proxy: Формирует настройки прокси для юзербота.
+- reload_proxy_config: Сбрасывает закешированные настройки прокси.
 """
 
 # --- Стандартные библиотеки ---
 import logging
+from collections import namedtuple
+from functools import lru_cache
 
 # --- Сторонние библиотеки ---
 from aiogram.client.session.aiohttp import AiohttpSession
-from dotenv import load_dotenv
 
 # --- Внутренние модули ---
 from services.config import set_use_proxy_bot, set_use_proxy_userbot, MORE_LOGS
-from utils.env_loader import get_env_variable
+from utils.env_loader import get_env_variable, invalidate_env_cache
 
 
-load_dotenv(override=False)
 logger = logging.getLogger(__name__)
 
-async def get_proxy_data(user_id: int, bot_id: int) -> dict | None:
+# Параметры прокси-соединения (неизменяемый кортеж, один экземпляр на процесс)
+ProxyData = namedtuple("ProxyData", "hostname port username password")
+_DISABLED = ProxyData(None, None, None, None) # Единственный экземпляр «прокси не настроен»
+
+
+def _parse_proxy_port(env_proxy_port: str | None) -> int | None:
+    """
+    Преобразует PROXY_PORT в число и проверяет диапазон.
+    :param env_proxy_port: Значение переменной окружения PROXY_PORT
+    :return: Номер порта или None, если порт не задан или некорректен
+    """
+    if not env_proxy_port:
+        return None
+    try:
+        port = int(env_proxy_port)
+    except ValueError:
+        logger.error(f"Некорректный PROXY_PORT: {env_proxy_port!r}. Прокси не будет использоваться.")
+        return None
+    if not 0 < port < 65536:
+        logger.error(f"PROXY_PORT вне допустимого диапазона: {port}. Прокси не будет использоваться.")
+        return None
+    return port
+
+
+@lru_cache(maxsize=None)
+def _proxy_env() -> ProxyData:
+    """
+    Читает параметры прокси из окружения один раз за процесс.
+    Для повторного чтения вызовите _proxy_env.cache_clear().
+    :return: ProxyData (hostname, port, username, password) или _DISABLED, если прокси не настроен
+    """
+    hostname = get_env_variable("PROXY_HOSTNAME", None)
+    port = _parse_proxy_port(get_env_variable("PROXY_PORT", None))
+    if not hostname or not port:
+        return _DISABLED
+    return ProxyData(
+        hostname,
+        port,
+        get_env_variable("PROXY_USERNAME", None),
+        get_env_variable("PROXY_PASSWORD", None)
+    )
+
+
+def _read_use_proxy_flag(env_key: str, setter) -> bool | None:
+    """
+    Читает флаг USE_PROXY_* из окружения и передаёт его в конфигурацию.
+    :param env_key: Название переменной окружения
+    :param setter: Функция сохранения флага в services.config
+    :return: Значение флага или None, если переменная не задана
+    """
+    env_value = get_env_variable(env_key, None)
+    if env_value is None:
+        return None
+    use_proxy = env_value.lower() == "true"
+    setter(use_proxy)
+    return use_proxy
+
+
+@lru_cache(maxsize=None)
+def _use_proxy_bot() -> bool | None:
+    return _read_use_proxy_flag("USE_PROXY_BOT", set_use_proxy_bot)
+
+
+@lru_cache(maxsize=None)
+def _use_proxy_userbot() -> bool | None:
+    return _read_use_proxy_flag("USE_PROXY_USERBOT", set_use_proxy_userbot)
+
+
+def get_proxy_data(user_id: int, bot_id: int) -> ProxyData | None:
     """
     Возвращает данные для прокси-соединения для указанного пользователя.
 
     :param user_id: Telegram ID пользователя, для которого запрашиваются настройки прокси.
     :param bot_id: ID бота, если требуется специфическая конфигурация для бота.
-    :return: Словарь с полями 'hostname', 'port', 'username', 'password' или None, если прокси не используется.
+    :return: ProxyData с полями hostname, port, username, password или None, если прокси не используется.
     """
     if MORE_LOGS:
-        logger.info(f"Получаем proxy данные для user_id: {user_id}, bot_id: {bot_id}")
-    
-    env_proxy_hostname = get_env_variable("PROXY_HOSTNAME", None)
-    env_proxy_port = get_env_variable("PROXY_PORT", None)
-    env_proxy_username = get_env_variable("PROXY_USERNAME", None)
-    env_proxy_password = get_env_variable("PROXY_PASSWORD", None)
-
-    proxy = {
-        "hostname": env_proxy_hostname,
-        "port": int(env_proxy_port) if env_proxy_port else None,
-        "username": env_proxy_username,
-        "password": env_proxy_password
-    }
+        logger.info("Получаем proxy данные для user_id: %s, bot_id: %s", user_id, bot_id)
 
-    # Проверяем, если данные прокси пустые, возвращаем None
-    if not proxy.get("hostname") or not proxy.get("port"):
-        return None
+    proxy = _proxy_env()
+    # Внутренний маркер _DISABLED наружу не отдаём: для вызывающего кода «нет прокси» — это None
+    return None if proxy is _DISABLED else proxy
+
+
+@lru_cache(maxsize=1)
+def _build_proxy_artifacts() -> tuple[str | None, dict | None]:
+    """
+    Один раз за процесс собирает из окружения всё, что нужно для прокси:
+    URL SOCKS5-прокси для aiohttp-сессии бота и словарь настроек прокси для юзербота.
+    :return: Кортеж (proxy_url, userbot_settings) или (None, None), если прокси не настроен
+    """
+    proxy = _proxy_env()
+    if proxy is _DISABLED:
+        return None, None
+    proxy_url = f"socks5://{proxy.username}:{proxy.password}@{proxy.hostname}:{proxy.port}"
+    userbot_settings = {
+        "scheme": "socks5",
+        "hostname": proxy.hostname,
+        "port": proxy.port,
+        "username": proxy.username,
+        "password": proxy.password
+    }
+    return proxy_url, userbot_settings
 
-    return proxy
 
 async def get_aiohttp_session(user_id: int) -> AiohttpSession | None:
     """
@@ -63,35 +140,26 @@ async def get_aiohttp_session(user_id: int) -> AiohttpSession | None:
     :param user_id: Telegram ID пользователя.
     :return: Экземпляр AiohttpSession с прокси или None, если прокси не используется.
     """
-    # Проверяем состояние использования прокси для бота
-    # Проверяем наличие параметра USE_PROXY_BOT
-    use_proxy_bot = None
-    env_use_proxy_bot = get_env_variable("USE_PROXY_BOT", None)
-    if env_use_proxy_bot is not None:
-        use_proxy_bot = env_use_proxy_bot.lower() == "true"
-        set_use_proxy_bot(use_proxy_bot)
+    # Проверяем состояние использования прокси для бота (USE_PROXY_BOT читается один раз)
+    use_proxy_bot = _use_proxy_bot()
 
     # Проверяем, если прокси не используется
     if not use_proxy_bot:
         if MORE_LOGS: logger.info("Прерываем выполнение функции get_aiohttp_session")
         return None
-    
-    data_proxy = await get_proxy_data(user_id, None)
-    if not data_proxy: 
+
+    proxy_url = _build_proxy_artifacts()[0]
+    if not proxy_url:
         if MORE_LOGS: logger.info("Прерываем выполнение функции get_aiohttp_session")
         return None
-    else:
-        logger.info(f"Используем прокси для бота: {data_proxy['hostname'][:5]}...:{str(data_proxy['port'])[:5]}...")
 
-    proxy_url = f"socks5://{data_proxy.get('username')}:{data_proxy.get('password')}@{data_proxy.get('hostname')}:{data_proxy.get('port')}"
+    if logger.isEnabledFor(logging.INFO):
+        hostname, port = _proxy_env()[:2]
+        logger.info("Используем прокси для бота: %s...:%s...", hostname[:5], str(port)[:5])
+    return AiohttpSession(proxy=proxy_url)
 
-    if proxy_url:
-        return AiohttpSession(proxy=proxy_url)
-    else:
-        if MORE_LOGS: logger.info("Прерываем выполнение функции get_aiohttp_session")
-        return None
-    
-async def get_userbot_proxy(user_id: int, bot_id: int) -> dict | None:
+
+def get_userbot_proxy(user_id: int, bot_id: int) -> dict | None:
     """
     Формирует словарь настроек прокси для подключения юзербота.
 
@@ -99,32 +167,34 @@ async def get_userbot_proxy(user_id: int, bot_id: int) -> dict | None:
     :param bot_id: ID бота, если требуется специфическая конфигурация для бота.
     :return: Словарь настроек прокси или None, если прокси не используется.
     """
-    # Проверяем состояние использования прокси для юзербота
-    # Проверяем наличие параметра USE_PROXY_USERBOT
-    use_proxy_userbot = None
-    env_use_proxy_userbot = get_env_variable("USE_PROXY_USERBOT", None)
-    if env_use_proxy_userbot is not None:
-        use_proxy_userbot = env_use_proxy_userbot.lower() == "true"
-        set_use_proxy_userbot(use_proxy_userbot)
+    # Проверяем состояние использования прокси для юзербота (USE_PROXY_USERBOT читается один раз)
+    use_proxy_userbot = _use_proxy_userbot()
 
     # Проверяем, если прокси не используется
     if not use_proxy_userbot:
         if MORE_LOGS: logger.info("Прерываем выполнение функции get_userbot_proxy")
         return None
-    
-    data_proxy = await get_proxy_data(user_id, bot_id)
-    if not data_proxy: 
+
+    settings = _build_proxy_artifacts()[1]
+    if not settings:
         if MORE_LOGS: logger.info("Прерываем выполнение функции get_userbot_proxy")
         return None
-    else:
-        logger.info(f"Используем прокси для юзербота: hostname: {data_proxy['hostname'][:4]}..{data_proxy['hostname'][-4:]}, port: {str(data_proxy['port'])[:2]}..{str(data_proxy['port'])[-2:]}")
 
-    settings = {
-        "scheme": "socks5",
-        "hostname": data_proxy.get("hostname"),
-        "port": data_proxy.get("port"),
-        "username": data_proxy.get("username"),
-        "password": data_proxy.get("password")
-    }
+    if logger.isEnabledFor(logging.INFO):
+        hostname, port = settings["hostname"], str(settings["port"])
+        logger.info(
+            "Используем прокси для юзербота: hostname: %s..%s, port: %s..%s",
+            hostname[:4], hostname[-4:], port[:2], port[-2:]
+        )
+    return settings
+
 
-    return settings
\ No newline at end of file
+def reload_proxy_config() -> None:
+    """
+    Сбрасывает закешированные настройки прокси: при следующем обращении
+    флаги USE_PROXY_* и параметры прокси будут заново прочитаны из окружения.
+    """
+    # get_env_variable читает из снимка окружения — без сброса снимка новые значения не увидеть
+    invalidate_env_cache()
+    for cached in (_proxy_env, _use_proxy_bot, _use_proxy_userbot, _build_proxy_artifacts):
+        cached.cache_clear()